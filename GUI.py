@@ -1,8 +1,11 @@
 import sys
 import db_data_funcs as db
-from pathlib import Path
+from collections import OrderedDict
 from jinja2 import Environment, FileSystemLoader
 from main_generate import MBCharacter
+from export_cache import get_export_cache, export_key, EXPORT_DIR
+from pdf_export import pdf_document, PDF_PAGES, PDF_TEMPLATE, REPO_ROOT
+from search import search_sqlite, search_row
 
 from PyQt6.QtWidgets import (
     QApplication,
@@ -13,118 +16,336 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
     QDialog,
     QListWidget,
+    QListView,
+    QLineEdit,
     QMainWindow,
     QLabel,
 )
 from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtCore import QUrl, QTimer, QSize, Qt
-from PyQt6.QtGui import QPixmap
-
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile, QWebEngineScript
+from PyQt6.QtCore import (
+    QUrl,
+    QTimer,
+    Qt,
+    QObject,
+    QEvent,
+    QMarginsF,
+    QSize,
+    QRunnable,
+    QThreadPool,
+    QFileSystemWatcher,
+    QAbstractListModel,
+    QModelIndex,
+    pyqtSignal,
+)
+from PyQt6.QtGui import QImage, QPixmap, QPageLayout, QPageSize
 
 # --- GENERATION WEB ---
+# Sheets are laid out for a 1200px wide window; pages are cropped to content
+SHEET_WIDTH = 1200
+SHEET_HEIGHT = 3000
+# A page that never reports ready is given up on
+RENDER_TIMEOUT_MS = 15000
+# Puts "ready:<height>" into the title once the page has loaded and
+# its fonts and images are decoded
+READY_SCRIPT = """
+const frame = () =>
+    new Promise((resolve) => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+const loaded = new Promise((resolve) =>
+    document.readyState === "complete" ? resolve() : addEventListener("load", resolve)
+);
+Promise.all([
+    loaded,
+    document.fonts.ready,
+    ...Array.from(document.images, (img) => img.decode().catch(() => {})),
+])
+    .then(frame)
+    .then(() => {
+        const body = document.body;
+        const margin = parseFloat(getComputedStyle(body).marginBottom);
+        document.title = `ready:${Math.ceil(body.getBoundingClientRect().bottom + margin)}`;
+    });
+"""
+
+_profile = None
+
+
+def sheet_profile():
+    """
+    One QtWebEngine profile for every sheet render, with READY_SCRIPT.
+    """
+    global _profile
+    if _profile is None:
+        _profile = QWebEngineProfile(QApplication.instance())
+        script = QWebEngineScript()
+        script.setName("sheet-ready")
+        script.setInjectionPoint(QWebEngineScript.InjectionPoint.DocumentReady)
+        script.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        script.setSourceCode(READY_SCRIPT)
+        _profile.scripts().insert(script)
+    return _profile
+
+
+def _is_flat(image):
+    """
+    True for an image of a single color, i.e. a frame without the page.
+    """
+    flat = QImage(image.size(), image.format())
+    flat.fill(image.pixel(0, 0))
+    return image == flat
+
+
+class SheetRenderer(QObject):
+    """
+    Renders one page in an offscreen view and saves it as PNG: after the
+    page reports ready, the view is grabbed on each paint until two frames
+    in a row are the same.
+    """
+
+    finished = pyqtSignal(bool)
+
+    def __init__(self, html, filename, parent=None):
+        super().__init__(parent)
+        self._filename = filename
+        self._height = None
+        self._last = None
+        self._done = False
+
+        self.view = QWebEngineView()
+        self.view.setPage(QWebEnginePage(sheet_profile(), self.view))
+        self.view.setAttribute(Qt.WidgetAttribute.WA_DontShowOnScreen, True)
+        self.view.resize(SHEET_WIDTH, SHEET_HEIGHT)
+        self.view.page().titleChanged.connect(self._on_title)
+        self.view.loadFinished.connect(self._on_loaded)
+        self.view.show()
+
+        QTimer.singleShot(RENDER_TIMEOUT_MS, lambda: self._finish(False))
+        self.view.setHtml(html, baseUrl=QUrl.fromLocalFile(str(REPO_ROOT) + "/"))
+
+    def _on_loaded(self, ok):
+        if not ok:
+            self._finish(False)
+
+    def _on_title(self, title):
+        state, _, height = title.partition(":")
+        if state != "ready" or self._height is not None:
+            return
+        self._height = min(int(height), SHEET_HEIGHT)
+
+        proxy = self.view.focusProxy()
+        proxy.installEventFilter(self)
+        proxy.update()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            # Grab once this paint is through
+            QTimer.singleShot(0, self._grab)
+        return False
+
+    def _grab(self):
+        if self._done:
+            return
+        pixmap = self.view.grab()
+        ratio = pixmap.devicePixelRatio()
+        pixmap = pixmap.copy(0, 0, int(SHEET_WIDTH * ratio), int(self._height * ratio))
+        image = pixmap.toImage()
+        if _is_flat(image) or image != self._last:
+            # The frame is not there or still changes (images are painted
+            # after the text): compare with the next paint
+            self._last = image
+            proxy = self.view.focusProxy()
+            proxy.installEventFilter(self)
+            proxy.update()
+            return
+        self._finish(pixmap.save(str(self._filename)))
+
+    def _finish(self, ok):
+        if self._done:
+            return
+        self._done = True
+        self.view.deleteLater()
+        self.finished.emit(ok)
+
+
 class WebWindow(QMainWindow):
-    def __init__(self):
+    """
+    Renders every local page of one character in parallel into
+    exports/<key>/01.png..05.png; `finished` carries that folder, or ""
+    if a page failed.
+    """
+
+    finished = pyqtSignal(str)
+
+    def __init__(self, character=None):
         super().__init__()
-        self._REPO_ROOT = Path(__file__).resolve().parent
+        self._REPO_ROOT = REPO_ROOT
         self._TEMPLATES_DIR = self._REPO_ROOT / "templates"
         self._STATIC_DIR = self._REPO_ROOT / "static"
-        self._EXPORT_DIR = self._REPO_ROOT / "exports"
-        self._EXPORT_DIR.mkdir(exist_ok=True)
-        self._PAGES = [
-            "character_local_one.html",
-            "character_local_two.html",
-            "character_local_three.html",
-            "character_local_four.html",
-            "character_local_five.html",
-        ]
+        self._PAGES = PDF_PAGES
 
-        self.view = QWebEngineView()
-        self.setCentralWidget(self.view)
+        self.status = QLabel("Рендер персонажа...")
+        self.setCentralWidget(self.status)
 
         self.env = Environment(
             loader=FileSystemLoader(self._TEMPLATES_DIR), autoescape=True
         )
 
-        self._page_index = 0
-        self._character = self.generate_character()
+        self._character = character or self.generate_character()
+        self._renderers = []
+        self._left = 0
+        self._failed = 0
 
-        self.view.loadFinished.connect(self._on_loaded)
+        # Same character and templates: the pages are already on disk
+        self._cache = get_export_cache()
+        self._key = export_key(self._character, self._PAGES)
+        self.export_dir = self._cache.lookup(self._key)
+        if self.export_dir is None:
+            self._staged = self._cache.stage()
 
         self.resize(1200, 800)
         self.setWindowFlag(Qt.WindowType.Tool, True)
         self.showMinimized()
 
-        QTimer.singleShot(0, self._load_current_page)
-
-    def on_loaded(self):
-        QTimer.singleShot(300, self.save_to_image)
-
-    def _grab_and_restore(self, original_size, filename="character.png"):
-        pixmap = self.view.grab()
-        pixmap.save(filename)
-
-        self.view.resize(original_size)
-
-    def save_to_image(self, filename="character.png"):
-        page = self.view.page()
-
-        size = page.contentsSize()
-        full_size = QSize(int(size.width()), int(size.height()))
-        original_size = self.view.size()
-        self.view.resize(full_size)
-
-        QTimer.singleShot(200, lambda: self._grab_and_restore(original_size))
+        QTimer.singleShot(0, self._render_pages)
 
     def generate_character(self):
         test = MBCharacter()
         test.generate()
         return dict(test.character.__dict__)
 
-    def _load_current_page(self):
-        if self._page_index >= len(self._PAGES):
+    def _render_pages(self):
+        if self.export_dir is not None:
+            self._finish()
+            return
+
+        self._left = len(self._PAGES)
+        for index, tpl_name in enumerate(self._PAGES):
+            template = self.env.get_template(tpl_name)
+            html = template.render(character=self._character)
+
+            filename = self._staged / f"{index + 1:02d}.png"
+            renderer = SheetRenderer(html, filename, self)
+            renderer.finished.connect(self._on_page_done)
+            self._renderers.append(renderer)
+
+    def _on_page_done(self, ok):
+        self._left -= 1
+        if not ok:
+            self._failed += 1
+        if self._left == 0:
+            self._finish()
+
+    def _finish(self):
+        if self._failed:
+            # An entry missing a page would be served as a hit forever
+            self._cache.discard(self._staged)
+            self.finished.emit("")
             self.close()
             return
+        if self.export_dir is None:
+            self.export_dir = self._cache.commit(self._key, self._staged)
+        self.finished.emit(str(self.export_dir))
+        self.close()
 
-        tpl_name = self._PAGES[self._page_index]
-        template = self.env.get_template(tpl_name)
-        html = template.render(character=self._character)
 
-        self.view.setHtml(
-            html, baseUrl=QUrl.fromLocalFile(str(self._REPO_ROOT.resolve()) + "/")
+# --- PDF EXPORT ---
+class PdfExporter(QObject):
+    """
+    Prints all local pages of one character into exports/<key>/character.pdf
+    in a single pass; `finished` carries the path, or "" on failure.
+    """
+
+    finished = pyqtSignal(str)
+
+    def __init__(self, character, parent=None):
+        super().__init__(parent)
+        self._character = character
+        self._cache = get_export_cache()
+        self._key = export_key(character, [*PDF_PAGES, PDF_TEMPLATE], variant="pdf")
+
+        self._page = QWebEnginePage(sheet_profile(), self)
+        self._page.loadFinished.connect(self._on_loaded)
+        self._page.pdfPrintingFinished.connect(self._on_printed)
+
+    def start(self):
+        entry = self._cache.lookup(self._key)
+        if entry is not None:
+            self.finished.emit(str(entry / "character.pdf"))
+            return
+
+        self._staged = self._cache.stage()
+        self._page.setHtml(
+            pdf_document(self._character),
+            baseUrl=QUrl.fromLocalFile(str(REPO_ROOT) + "/"),
         )
 
     def _on_loaded(self, ok):
         if not ok:
-            print("Не загрузилось")
-            self._page_index += 1
-            self._load_current_page()
+            self._fail()
             return
 
-        QTimer.singleShot(300, self._save_current_page)
+        layout = QPageLayout(
+            QPageSize(QPageSize.PageSizeId.A4),
+            QPageLayout.Orientation.Portrait,
+            QMarginsF(8, 8, 8, 8),
+            QPageLayout.Unit.Millimeter,
+        )
+        self._page.printToPdf(str(self._staged / "character.pdf"), layout)
+
+    def _on_printed(self, path, ok):
+        if not ok:
+            self._fail()
+            return
+        entry = self._cache.commit(self._key, self._staged)
+        self.finished.emit(str(entry / "character.pdf"))
 
-    def _save_current_page(self):
-        page = self.view.page()
-        sizef = page.contentsSize()
+    def _fail(self):
+        # Nothing of a failed export stays in the cache
+        self._cache.discard(self._staged)
+        self.finished.emit("")
 
-        full_size = QSize(int(sizef.width()), int(sizef.height()))
-        original_size = self.view.size()
 
-        self.view.resize(full_size)
+# --- IMAGES  ---
+# Decoded, scaled sheets kept in memory by the viewer
+VIEWER_CACHE_BYTES = 64 * 1024 * 1024
+# Images decoded ahead on each side of the current one
+VIEWER_PREFETCH = 1
 
-        QTimer.singleShot(200, lambda: self._grab_and_next(original_size))
 
-    def _grab_and_next(self, original_size):
-        filename = self._EXPORT_DIR / f"{self._page_index + 1:02d}.png"
-        pixmap = self.view.grab()
-        pixmap.save(str(filename))
+def export_images(folder):
+    """
+    Sheets of one export folder: exports/*.png or the PNGs of a cache entry.
+    """
+    return sorted(folder.glob("*.png"))
 
-        self.view.resize(original_size)
 
-        self._page_index += 1
-        self._load_current_page()
+class _ImageSignals(QObject):
+    loaded = pyqtSignal(str, QSize, QImage)
+
+
+class _ImageLoader(QRunnable):
+    """
+    Decodes and scales one image off the UI thread.
+    """
+
+    def __init__(self, path, size, signals):
+        super().__init__()
+        self._path = path
+        self._size = size
+        self._signals = signals
+
+    def run(self):
+        image = QImage(self._path)
+        if not image.isNull():
+            image = image.scaled(
+                self._size,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            )
+        self._signals.loaded.emit(self._path, self._size, image)
 
 
-# --- IMAGES  ---
 class ImageViewer(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -134,22 +355,100 @@ class ImageViewer(QMainWindow):
         self.label = QLabel(alignment=Qt.AlignmentFlag.AlignCenter)
         self.setCentralWidget(self.label)
 
-        self.images = sorted(Path("exports").glob("*.png"))
-        self.index = 0
+        # (path, size) -> QImage, least recently used first
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._loading = set()
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._signals = _ImageSignals(self)
+        self._signals.loaded.connect(self._on_loaded)
 
+        # Cache entries appear by rename and never change: watching the
+        # export folder itself is enough to see new and evicted sheets
+        self._folders = {}
+        self.images = []
+        self.index = 0
+        self._watcher = QFileSystemWatcher([str(EXPORT_DIR)], self)
+        self._watcher.directoryChanged.connect(self._rescan)
+        self._rescan()
+
+    def _rescan(self):
+        current = self.images[self.index] if self.images else None
+
+        # Only new entries are listed; evicted ones drop out
+        self._folders = {
+            path: self._folders.get(path) or export_images(path)
+            for path in EXPORT_DIR.iterdir()
+            if path.is_dir() and path.name != ".staging"
+        }
+        self.images = sorted(
+            [
+                *export_images(EXPORT_DIR),
+                *(path for images in self._folders.values() for path in images),
+            ]
+        )
+        self.index = self.images.index(current) if current in self.images else 0
         self.show_image()
 
+    def _target(self):
+        return self.label.size()
+
+    def _cached(self, path, size):
+        key = (str(path), size)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+        return image
+
+    def _load(self, path, size):
+        key = (str(path), size)
+        if key in self._cache or key in self._loading:
+            return
+        self._loading.add(key)
+        self._pool.start(_ImageLoader(str(path), size, self._signals))
+
+    def _on_loaded(self, path, size, image):
+        key = (path, size)
+        self._loading.discard(key)
+        if image.isNull():
+            return
+        self._cache[key] = image
+        self._cache_bytes += image.sizeInBytes()
+        # The newest image stays even if it alone is over the limit
+        while self._cache_bytes > VIEWER_CACHE_BYTES and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._cache_bytes -= old.sizeInBytes()
+
+        if self.images and path == str(self.images[self.index]):
+            if size == self._target():
+                self.label.setPixmap(QPixmap.fromImage(image))
+
     def show_image(self):
-        pixmap = QPixmap(str(self.images[self.index]))
-        self.label.setPixmap(
-            pixmap.scaled(
-                self.label.size(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation,
-            )
-        )
+        if not self.images:
+            self.label.setText("Нет сохраненных персонажей")
+            return
+
+        size = self._target()
+        image = self._cached(self.images[self.index], size)
+        if image is not None:
+            self.label.setPixmap(QPixmap.fromImage(image))
+        else:
+            self._load(self.images[self.index], size)
+
+        for step in range(1, VIEWER_PREFETCH + 1):
+            for index in (self.index + step, self.index - step):
+                self._load(self.images[index % len(self.images)], size)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.show_image()
 
     def keyPressEvent(self, event):
+        if not self.images:
+            return
+
         if event.key() == Qt.Key.Key_Right:
             self.index = (self.index + 1) % len(self.images)
             self.show_image()
@@ -205,6 +504,130 @@ class NarativeSelectDialog(QDialog):
         return item.text() if item else None
 
 
+# --- ASYNC DB ---
+# Search waits for a pause in typing
+SEARCH_DELAY_MS = 250
+
+
+class _DbSignals(QObject):
+    done = pyqtSignal(str, int, object)
+    failed = pyqtSignal(str, int, str)
+
+
+class _DbTask(QRunnable):
+    def __init__(self, runner, channel, generation, func, args):
+        super().__init__()
+        self._runner = runner
+        self._channel = channel
+        self._generation = generation
+        self._func = func
+        self._args = args
+
+    def run(self):
+        # A newer request on the channel came in while this one waited
+        if not self._runner.is_current(self._channel, self._generation):
+            return
+        try:
+            result = self._func(*self._args)
+        except Exception as e:
+            self._runner.signals.failed.emit(self._channel, self._generation, str(e))
+            return
+        self._runner.signals.done.emit(self._channel, self._generation, result)
+
+
+class DbRunner(QObject):
+    """
+    Runs db_data_funcs calls on a thread pool; each call checks a
+    connection out of db's shared pool for its duration. Requests share a
+    channel ("list", "details"): only the latest one of a channel is run
+    and delivered, stale ones are dropped.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._generations = {}
+        self._callbacks = {}
+
+        self.signals = _DbSignals(self)
+        self.signals.done.connect(self._on_done)
+        self.signals.failed.connect(self._on_failed)
+
+    def run(self, channel, func, callback, *args, on_error=None):
+        generation = self._generations.get(channel, 0) + 1
+        self._generations[channel] = generation
+        self._callbacks[channel] = (callback, on_error)
+        self._pool.start(_DbTask(self, channel, generation, func, args))
+
+    def cancel(self, channel):
+        # Whatever is pending on the channel is not delivered any more
+        self._generations[channel] = self._generations.get(channel, 0) + 1
+        self._callbacks.pop(channel, None)
+
+    def is_current(self, channel, generation):
+        return self._generations.get(channel) == generation
+
+    def _on_done(self, channel, generation, result):
+        if self.is_current(channel, generation):
+            callback, _ = self._callbacks.pop(channel)
+            callback(result)
+
+    def _on_failed(self, channel, generation, error):
+        if self.is_current(channel, generation):
+            _, on_error = self._callbacks.pop(channel)
+            if on_error is not None:
+                on_error(error)
+
+
+class NameListModel(QAbstractListModel):
+    """
+    Names for the list view; rows are handed to the view in batches as it
+    scrolls, so a long list is not laid out at once.
+    """
+
+    BATCH = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        self._shown = 0
+
+    def set_names(self, names):
+        self.beginResetModel()
+        self._names = list(names)
+        self._shown = min(len(self._names), self.BATCH)
+        self.endResetModel()
+
+    def name(self, row):
+        return self._names[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._shown
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
+            return self._names[index.row()]
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._shown < len(self._names)
+
+    def fetchMore(self, parent):
+        count = min(self.BATCH, len(self._names) - self._shown)
+        self.beginInsertRows(QModelIndex(), self._shown, self._shown + count - 1)
+        self._shown += count
+        self.endInsertRows()
+
+
+def _names(func, *args):
+    return [row["name_ru"] for row in func(*args)]
+
+
+def _info_text(info):
+    return "\n".join([f"{k}: {v}" for k, v in info.items()])
+
+
 # --- MAIN CLASS ---
 class MainWindow(QWidget):
     def __init__(self):
@@ -268,6 +691,9 @@ class MainWindow(QWidget):
         # GENERATE
         self.btn_generate = QPushButton("Сгенерировать персонажа")
         self.btn_generate.clicked.connect(self.open_web)
+        # PDF
+        self.btn_pdf = QPushButton("Сохранить персонажа в PDF")
+        self.btn_pdf.clicked.connect(self.export_pdf)
         # IMAGES
         self.btn_img = QPushButton("Открыть просмотрщик")
         self.btn_img.clicked.connect(self.open_viewer)
@@ -281,15 +707,30 @@ class MainWindow(QWidget):
         left_layout.addWidget(self.btn_memorie)
         left_layout.addWidget(self.btn_narative)
         left_layout.addWidget(self.btn_generate)
+        left_layout.addWidget(self.btn_pdf)
         left_layout.addWidget(self.btn_img)
         # endregion
 
         # region --- CONTENT WINDOW ---
-        self.output = QListWidget()
-        self.output.itemClicked.connect(self.on_item_clicked)
+        self.db = DbRunner(self)
+        self.names = NameListModel(self)
+        self.output = QListView()
+        self.output.setUniformItemSizes(True)
+        self.output.setModel(self.names)
+        self.output.clicked.connect(self.on_item_clicked)
         self.current_mode = None
 
-        root.addWidget(self.output, 1)
+        # SEARCH: runs once typing pauses
+        self.search = QLineEdit(placeholderText="Поиск по компендиуму")
+        self._search_timer = QTimer(self, singleShot=True, interval=SEARCH_DELAY_MS)
+        self._search_timer.timeout.connect(self.run_search)
+        self.search.textChanged.connect(lambda _: self._search_timer.start())
+        self._hits = []
+
+        middle = QVBoxLayout()
+        middle.addWidget(self.search)
+        middle.addWidget(self.output)
+        root.addLayout(middle, 1)
 
         self.main_output = QTextEdit()
         self.main_output.setReadOnly(True)
@@ -298,17 +739,52 @@ class MainWindow(QWidget):
 
     # --- Standart Buttons ---
     def show_all_names(self, mode, func):
-        self.output.clear()
         self.main_output.clear()
         self.current_mode = mode
+        self.show_list(_names, func)
+
+    def show_list(self, func, *args):
+        self.names.set_names([])
+        self.db.run("list", func, self.names.set_names, *args, on_error=self.show_error)
+
+    def show_details(self, func, *args, fmt=_info_text):
+        self.db.run(
+            "details",
+            func,
+            lambda info: self.main_output.setPlainText(fmt(info)),
+            *args,
+            on_error=self.show_error,
+        )
 
-        rows = func()
-        text = [r["name_ru"] for r in rows]
-        for el in text:
-            self.output.addItem(el)
+    def run_search(self):
+        query = self.search.text().strip()
+        if not query:
+            return
+        self.current_mode = "search"
+        self.main_output.clear()
+        self.names.set_names([])
+        self.db.run(
+            "list", self._search, self._show_hits, query, on_error=self.show_error
+        )
+
+    def _search(self, query):
+        # Worker thread: hits are kept for clicks, the view gets the labels
+        hits = search_sqlite(query)
+        return hits, [f"{hit['title']} [{hit['section']}]" for hit in hits]
+
+    def _show_hits(self, result):
+        self._hits, labels = result
+        self.names.set_names(labels)
 
-    def on_item_clicked(self, item):
-        name = item.text()
+    def show_error(self, error):
+        self.main_output.setPlainText(f"Ошибка базы: {error}")
+
+    def on_item_clicked(self, index):
+        if self.current_mode == "search":
+            hit = self._hits[index.row()]
+            self.show_details(search_row, hit["section"], hit["id"])
+            return
+        name = self.names.name(index.row())
 
         handlers = {
             "classes": self.show_class_details,
@@ -330,50 +806,36 @@ class MainWindow(QWidget):
 
     # region --- SHOW INFO LOGIC ---
     def show_class_details(self, name):
-        info = db.show_info_classes(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_classes, name)
 
     def show_item_details(self, name):
-        info = db.show_info_items(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_items, name)
 
     def show_weapon_details(self, name):
-        info = db.show_info_weapons(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_weapons, name)
 
     def show_armor_details(self, name):
-        info = db.show_info_armor(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_armor, name)
 
     def show_skill_details(self, name):
-        info = db.show_info_skill(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_skill, name)
 
     def show_bonus_details(self, name):
-        info = db.show_info_bonuses(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_bonuses, name)
 
     def show_memorie_details(self, name):
-        info = db.show_info_memories(name)
-        text = "\n".join([f"{k}: {v}" for k, v in info.items()])
-        self.main_output.setPlainText(text)
+        self.show_details(db.show_info_memories, name)
 
     def show_narative_details(self, name):
-        name = self.narative_list[name]
-        info = db.show_all_narratives(name)
-        text = "\n\n".join(info)
-        self.main_output.setPlainText(text)
+        self.show_details(
+            db.show_all_narratives, self.narative_list[name], fmt="\n\n".join
+        )
 
     # endregion
 
     def show_bonuses(self):
-        self.output.clear()
+        self.db.cancel("list")
+        self.names.set_names([])
         self.current_mode = "bonuses"
         dialog = ClassSelectDialog(self)
 
@@ -382,20 +844,16 @@ class MainWindow(QWidget):
             if not cls_name:
                 return
 
-            bonuses = db.show_all_bonuses(cls_name)
-
-            for el in bonuses:
-                self.output.addItem(el)
+            self.show_list(db.show_all_bonuses, cls_name)
 
     def show_narative(self):
-        self.output.clear()
         self.current_mode = "narative"
-
-        for key in self.narative_list.keys():
-            self.output.addItem(key)
+        self.db.cancel("list")
+        self.names.set_names(self.narative_list.keys())
 
     def show_memories(self):
-        self.output.clear()
+        self.db.cancel("list")
+        self.names.set_names([])
         self.current_mode = "memorie"
         dialog = ClassSelectDialog(self)
 
@@ -404,15 +862,33 @@ class MainWindow(QWidget):
             if not cls_name:
                 return
 
-            memories = db.show_all_memories(cls_name)
-
-            for el in memories:
-                self.output.addItem(el)
+            self.show_list(db.show_all_memories, cls_name)
 
     def open_web(self):
         self.web_window = WebWindow()
+        self.web_window.finished.connect(self.on_web_exported)
         self.web_window.show()
 
+    def on_web_exported(self, folder):
+        if folder:
+            self.main_output.setText(f"Листы сохранены: {folder}")
+        else:
+            self.main_output.setText("Не удалось отрендерить лист персонажа")
+
+    def export_pdf(self):
+        test = MBCharacter()
+        test.generate()
+
+        self.pdf_exporter = PdfExporter(dict(test.character.__dict__), self)
+        self.pdf_exporter.finished.connect(self.on_pdf_exported)
+        self.pdf_exporter.start()
+
+    def on_pdf_exported(self, path):
+        if path:
+            self.main_output.setText(f"PDF сохранен: {path}")
+        else:
+            self.main_output.setText("Не удалось сохранить PDF")
+
     def open_viewer(self):
         self.viewer = ImageViewer()
         self.viewer.show()
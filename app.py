@@ -1,9 +1,31 @@
-from playwright.sync_api import sync_playwright
-from pathlib import Path
+from exports import (
+    sheet_png,
+    sheet_pdf,
+    sheet_pngs,
+    zip_stream,
+    batch_seeds,
+    encode_image,
+    IMAGE_FORMATS,
+    EXPORT_FORMATS,
+)
+from pdf_export import pdf_document, PDF_PAGES, PDF_TEMPLATE
+from export_cache import get_export_cache, export_key, source_version
+from export_jobs import get_export_queue, QueueFull
 import tempfile
-from main_generate import MBCharacter
+from main_generate import (
+    MBCharacter,
+    SEED_LIMIT,
+    get_compendium,
+    reset_compendium,
+    parse_seed,
+)
 import re
-import psycopg2
+from random import randrange
+from dice import compile_formula, summarize, MAX_DICE, MAX_SIDES
+from pg_pool import get_pool, BROKEN_ERRORS
+from search import search_pg, SEARCH_LIMIT
+from revisions import table_revision
+from werkzeug.local import LocalProxy
 from flask import (
     Flask,
     render_template,
@@ -12,7 +34,9 @@ from flask import (
     url_for,
     g,
     session,
-    send_file,
+    make_response,
+    Response,
+    stream_with_context,
     jsonify,
 )
 from dotenv import load_dotenv
@@ -23,21 +47,40 @@ load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
-connection = psycopg2.connect(
-    dbname=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-)
-cursor = connection.cursor()
+
+
+# Every request checks out its own connection from the pool on first use
+# and hands it back on teardown; connection and cursor below resolve to it
+def get_db():
+    if "db" not in g:
+        g.db = get_pool().getconn()
+    return g.db
+
+
+def get_cursor():
+    if "cursor" not in g:
+        g.cursor = get_db().cursor()
+    return g.cursor
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    db = g.pop("db", None)
+    g.pop("cursor", None)
+    if db is not None:
+        get_pool().putconn(db, broken=isinstance(exc, BROKEN_ERRORS))
+
+
+connection = LocalProxy(get_db)
+cursor = LocalProxy(get_cursor)
 
 VALIDATION_TEXT = {
     "empty": "Значение не может быть пустым",
     "slug": "Только латиница, нижний регистр, слова через _",
     "name": "Только кирриллица, слова разделяются пробелом, никаких символов",
     "desc": "Только кириллица, допускается любая свободная форма, в конце точка",
-    "formula": "Только формат вида XdY/XdY±*Z (3d6/3d6±*2)",
+    "formula": "Только формат вида XdY/XdY±*Z (3d6/3d6±*2), "
+    f"от 1 до {MAX_DICE} костей, не больше {MAX_SIDES} граней",
     "dublicate": "Такой id уже есть в базе!",
     "count": "Только число от 0 до {} (включительно)",
     "or_empty": ". Либо оставьте пустым.",
@@ -52,7 +95,10 @@ def validate_form(slug=None, name=None, describe=None, formula=None, count=None)
     if describe:
         return re.fullmatch(r"^[А-ЯЁ][А-ЯЁа-яёA-Za-z0-9 \.,:;()\-!?+]*\.$", describe)
     if formula:
-        return re.fullmatch(r"(?:(\d*)d)?(\d+)([+\-\*])?(\d+)?", formula)
+        try:
+            return compile_formula(formula)
+        except ValueError:
+            return None
     if count:
         return 0 <= int(count[0]) <= count[1]
 
@@ -202,14 +248,95 @@ def check_for_valid(form, table, slugs=None, dublicate=True):
     return errors
 
 
+CLASS_STATS = {
+    "hp": "Здоровье",
+    "money": "Деньги",
+    "signs": "Знамения",
+    "agility": "Ловкость",
+    "presence": "Присутствие",
+    "strength": "Сила",
+    "toughness": "Стойкость",
+}
+
+
+# section -> (table, columns); pages are keyed by id, so a page costs
+# the same at the start and at the end of a large table
+LIBRARY_SECTIONS = {
+    "items": ("items", ["name_ru", "effect", "counts", "cost", "category"]),
+    "skills": ("skills", ["name_ru", "desc_ru"]),
+    "armors": ("armors", ["name_ru", "armor_level"]),
+    "weapons": ("weapons", ["name_ru", "damage"]),
+    "bonuses": ("bonuses", ["name_ru", "desc_ru"]),
+    "memories": ("memories", ["name_ru", "desc_ru"]),
+    "classes": ("classes", ["name_ru", "desc_ru"]),
+    "narrative": ("narrative", ["category", "text_ru"]),
+}
+LIBRARY_PAGE = 60
+# Everything a library page is rendered from, for its ETag
+LIBRARY_TEMPLATES = ["library.html"] + [
+    f"partials/{name}.html" for name in [*LIBRARY_SECTIONS, "class_stats"]
+]
+# Rows are shaped here and class stats summarized by dice
+LIBRARY_SOURCES = ["app.py", "dice.py"]
+
+
+def library_response(section, table, after=0):
+    """
+    Empty response carrying the validators of one library page (table
+    revision, page, templates and code), already checked against the request:
+    a 304 means the client's copy is current and nothing else is needed.
+    """
+    response = make_response("")
+    stamp = table_revision(connection, table)
+    if stamp is None:
+        return response
+    revision, modified = stamp
+    version = source_version(LIBRARY_TEMPLATES, LIBRARY_SOURCES)
+    response.set_etag(f"{section}-{after}-{revision}-{version}")
+    response.last_modified = modified
+    # Stored, but checked with the server every time
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def show_class_stats():
+    keys = ["name_ru"] + [f"{stat}_formula" for stat in CLASS_STATS]
+    rows = show_table_info("classes", keys=keys)
+    for row in rows:
+        # summarize() is memoized per formula, so repeat hits cost a dict lookup
+        row["stats"] = [
+            dict(summarize(row[f"{stat}_formula"]), name=name)
+            for stat, name in CLASS_STATS.items()
+            if row[f"{stat}_formula"]
+        ]
+    return rows
+
+
 def show_table_info(table, keys):
     with connection:
-        cursor.execute(f"SELECT {", ".join(keys)} FROM {table}")
+        cursor.execute(f"SELECT {', '.join(keys)} FROM {table}")
         values = cursor.fetchall()
         elements = [dict(zip(keys, row)) for row in values]
     return elements
 
 
+def show_table_page(table, keys, after=0, limit=LIBRARY_PAGE):
+    """
+    One page of `table` in id order, starting after id `after`.
+    Returns the rows and the id to continue from, None on the last page.
+    """
+    with connection:
+        cursor.execute(
+            f"SELECT id, {', '.join(keys)} FROM {table} "
+            f"WHERE id > %s ORDER BY id LIMIT %s",
+            (after, limit + 1),
+        )
+        values = cursor.fetchall()
+    elements = [dict(zip(["id", *keys], row)) for row in values[:limit]]
+    next_after = elements[-1]["id"] if len(values) > limit else None
+    return elements, next_after
+
+
 # MAIN PAGE
 @app.route("/")
 def index():
@@ -253,6 +380,7 @@ def add_class():
     simple_upload_db(db_class, "classes")
 
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -311,6 +439,7 @@ def add_skill():
         upload_db_returning(skill, "skills", class_id)
 
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -384,6 +513,7 @@ def add_bonus():
         upload_db_returning(bonus, "bonuses", class_id)
 
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -457,6 +587,7 @@ def add_memorie():
     for memorie in db_memorie:
         upload_db_returning(memorie, "memories", class_id)
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -500,6 +631,7 @@ def add_narrative():
     simple_upload_db(db_narrative, "narrative")
 
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -537,6 +669,7 @@ def add_armor():
     db_armor["effect"] = db_armor["effect"] if db_armor["effect"] else None
     simple_upload_db(db_armor, table)
     connection.commit()
+    reset_compendium()
 
     return redirect(url_for("index"))
 
@@ -568,6 +701,7 @@ def add_weapon():
 
     simple_upload_db(db_weapon, table)
     connection.commit()
+    reset_compendium()
 
     return redirect(url_for("index"))
 
@@ -613,6 +747,7 @@ def add_item():
     simple_upload_db(db_item, "items")
 
     connection.commit()
+    reset_compendium()
     return redirect(url_for("index"))
 
 
@@ -897,6 +1032,7 @@ def confirm_result():
         upload_db_returning(memorie, "memories", class_id)
 
     connection.commit()
+    reset_compendium()
     session.clear()
     return redirect(url_for("index"))
 
@@ -926,38 +1062,214 @@ def delete_test():
 
         # Class table third
         cursor.execute("DELETE FROM classes  WHERE slug LIKE 'test_%';")
+    reset_compendium()
 
     return "ok", 200
 
 
+def seeded_character(seed):
+    test = MBCharacter(get_compendium(), seed=seed)
+    test.generate()
+    return dict(test.character.__dict__.items())
+
+
+def render_character(seed, character=None):
+    ch = character or seeded_character(seed)
+    return render_template("character.html", character=ch, seed=seed)
+
+
 @app.route("/generate_character", methods=["GET", "POST"])
 def generate_character():
-    test = MBCharacter()
-    test.generate()
-    ch = dict(test.character.__dict__.items())
+    return redirect(url_for("character_sheet", seed=randrange(SEED_LIMIT)))
+
 
-    return render_template("character.html", character=ch)
+# Code a sheet is generated by, for its ETag
+CHARACTER_SOURCES = ["main_generate.py", "compendium.py", "dice.py"]
+
+
+@app.route("/character/<int:seed>")
+def character_sheet(seed):
+    # <int:> takes any size; a seed past SEED_LIMIT names no character
+    if seed >= SEED_LIMIT:
+        return "No such character", 404
+    compendium = get_compendium()
+    # Same seed, compendium, generator code and template give the same sheet
+    version = source_version(["character.html"], CHARACTER_SOURCES)
+    etag = f"{seed}-{compendium.fingerprint[:16]}-{version}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(render_character(seed))
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    # Revalidated on every use: a deploy changes the ETag, not the URL
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/export_png")
 def export_png():
-    relative_url = request.args.get("url")
-    full_url = f"http://127.0.0.1:5000{relative_url}"
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        # Sheets opened before the seed parameter link with ?url=/character/<seed>
+        match = re.fullmatch(r"/character/(\d+)", request.args.get("url", ""))
+        if match is None:
+            return "seed is required", 400
+        try:
+            seed = parse_seed(match.group(1))
+        except ValueError as e:
+            return str(e), 400
+
+    fmt = request.args.get("format", "png")
+    if fmt not in IMAGE_FORMATS:
+        return f"format must be one of {', '.join(IMAGE_FORMATS)}", 400
+
+    character = seeded_character(seed)
+    key = export_key(character, ["character.html"], variant=fmt)
+    # Rendered here: job workers run outside the request context
+    html = render_character(seed, character)
+    return enqueue_export(key, fmt, lambda: encode_image(sheet_png(html), fmt))
+
+
+@app.route("/export_pdf")
+def export_pdf():
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        return "seed is required", 400
+
+    character = seeded_character(seed)
+    key = export_key(character, [*PDF_PAGES, PDF_TEMPLATE], variant="pdf")
+    html = pdf_document(character)
+    return enqueue_export(key, "pdf", lambda: sheet_pdf(html))
+
+
+def queue_full(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.retry_after = error.retry_after
+    return response
+
+
+def enqueue_export(key, fmt, build):
+    extension = EXPORT_FORMATS[fmt][1]
+    try:
+        job = get_export_queue().submit(
+            f"{key}-{fmt}", key, f"character.{extension}", build
+        )
+    except QueueFull as e:
+        return queue_full(e)
 
-    out_path = Path("character.png")
+    status = job.as_dict()
+    return jsonify(export_job_json(status)), 200 if status["state"] == "done" else 202
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page(viewport={"width": 1200, "height": 1600})
 
-        page.goto(full_url, wait_until="networkidle")
+def export_job_json(status):
+    return {
+        **status,
+        "status_url": url_for("export_status", job_id=status["id"]),
+        "download_url": url_for("export_download", job_id=status["id"]),
+    }
 
-        sheet = page.locator("#sheet")
-        sheet.screenshot(path=str(out_path))
 
-        browser.close()
+@app.route("/export_jobs/<job_id>")
+def export_status(job_id):
+    status = get_export_queue().status(job_id)
+    if status is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(export_job_json(status))
 
-    return send_file(out_path, as_attachment=True, download_name="character.png")
+
+@app.route("/export_jobs/<job_id>/download")
+def export_download(job_id):
+    key, _, fmt = job_id.partition("-")
+    if fmt not in EXPORT_FORMATS:
+        return "unknown job", 404
+    mimetype, extension = EXPORT_FORMATS[fmt]
+
+    if request.if_none_match.contains(key):
+        response = make_response("", 304)
+    else:
+        entry = get_export_cache().lookup(key)
+        if entry is None:
+            status = get_export_queue().status(job_id)
+            if status is None:
+                return "unknown job", 404
+            # Still rendering, or failed and nothing to serve
+            code = 500 if status["state"] == "failed" else 202
+            return jsonify(export_job_json(status)), code
+        # Bytes body: Flask sets Content-Length, nothing touches a temp file
+        response = make_response((entry / f"character.{extension}").read_bytes())
+        response.mimetype = mimetype
+        response.headers["Content-Disposition"] = (
+            f'attachment; filename="character.{extension}"'
+        )
+
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+
+@app.route("/export_metrics")
+def export_metrics():
+    return jsonify(get_export_queue().metrics())
+
+
+# One ZIP stream can hold a browser for minutes; keep batches sane
+EXPORT_BATCH_LIMIT = 1000
+
+
+@app.route("/export_batch")
+def export_batch():
+    count = request.args.get("count", type=int)
+    if count is None or not 1 <= count <= EXPORT_BATCH_LIMIT:
+        return f"count must be between 1 and {EXPORT_BATCH_LIMIT}", 400
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        seed = randrange(SEED_LIMIT)
+
+    # Same limit as single exports
+    try:
+        release = get_export_queue().start_batch()
+    except QueueFull as e:
+        return queue_full(e)
+
+    def sheets():
+        for index, character_seed in enumerate(batch_seeds(count, seed), 1):
+            yield f"{index:04d}-{character_seed}.png", render_character(character_seed)
+
+    def stream():
+        try:
+            yield from zip_stream(sheet_pngs(sheets()))
+        finally:
+            release()
+
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="characters-{seed}.zip"'
+        },
+    )
+    # A stream that never starts never reaches the finally above
+    response.call_on_close(release)
+    return response
+
+
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, SEARCH_LIMIT))
+    return jsonify({"query": query, "results": search_pg(connection, query, limit)})
 
 
 @app.route("/library/<section>", methods=["GET", "POST"])
@@ -967,34 +1279,58 @@ def library_page(section):
         if action == "home":
             return redirect(url_for("index"))
 
-    match section:
-        case "items":
-            rows = show_table_info(
-                "items", keys=["name_ru", "effect", "counts", "cost", "category"]
-            )
-            partial = "partials/items.html"
-        case "skills":
-            rows = show_table_info("skills", keys=["name_ru", "desc_ru"])
-            partial = "partials/skills.html"
-        case "armors":
-            rows = show_table_info("armors", keys=["name_ru", "armor_level"])
-            partial = "partials/armors.html"
-        case "weapons":
-            rows = show_table_info("weapons", keys=["name_ru", "damage"])
-            partial = "partials/weapons.html"
-        case "bonuses":
-            rows = show_table_info("bonuses", keys=["name_ru", "desc_ru"])
-            partial = "partials/bonuses.html"
-        case "memories":
-            rows = show_table_info("memories", keys=["name_ru", "desc_ru"])
-            partial = "partials/memories.html"
-        case "classes":
-            rows = show_table_info("classes", keys=["name_ru", "desc_ru"])
-            partial = "partials/classes.html"
-        case "narrative":
-            rows = show_table_info("narrative", keys=["category", "text_ru"])
-            partial = "partials/narrative.html"
-    return render_template("library.html", section=section, rows=rows, partial=partial)
+    partial = f"partials/{section}.html"
+    if section == "class_stats":
+        table, after = "classes", 0
+    elif section in LIBRARY_SECTIONS:
+        table, keys = LIBRARY_SECTIONS[section]
+        after = request.args.get("after", 0, type=int)
+    else:
+        return "Unknown section", 404
+    # Revision check first: an unchanged page is neither queried nor rendered
+    response = library_response(section, table, after)
+    if response.status_code == 304:
+        return response
+
+    if section == "class_stats":
+        # A handful of classes: one page
+        rows, next_after = show_class_stats(), None
+    else:
+        rows, next_after = show_table_page(table, keys, after)
+    response.set_data(
+        render_template(
+            "library.html",
+            section=section,
+            rows=rows,
+            partial=partial,
+            next_after=next_after,
+        )
+    )
+    return response
+
+
+@app.route("/library/<section>/page")
+def library_next_page(section):
+    if section not in LIBRARY_SECTIONS:
+        return jsonify({"error": "unknown section"}), 404
+    table, keys = LIBRARY_SECTIONS[section]
+    after = request.args.get("after", 0, type=int)
+    response = library_response(f"{section}.json", table, after)
+    if response.status_code == 304:
+        return response
+
+    rows, next_after = show_table_page(table, keys, after)
+    response.mimetype = "application/json"
+    response.set_data(
+        app.json.dumps(
+            {
+                "rows": rows,
+                "html": render_template(f"partials/{section}.html", rows=rows),
+                "next": next_after,
+            }
+        )
+    )
+    return response
 
 
 if __name__ == "__main__":
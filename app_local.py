@@ -1,7 +1,22 @@
-from playwright.sync_api import sync_playwright
-from pathlib import Path
-from main_generate import MBCharacter
+from exports import (
+    sheet_png,
+    sheet_pdf,
+    sheet_pngs,
+    zip_stream,
+    batch_seeds,
+    encode_image,
+    IMAGE_FORMATS,
+    EXPORT_FORMATS,
+)
+from pdf_export import pdf_document, PDF_PAGES, PDF_TEMPLATE
+from export_cache import get_export_cache, export_key, source_version
+from export_jobs import get_export_queue, QueueFull
+from main_generate import MBCharacter, SEED_LIMIT, parse_seed
+from compendium import Compendium, SharedCompendium
+from search import search_sqlite, SEARCH_LIMIT
 import re
+from random import randrange
+from dice import compile_formula, MAX_DICE, MAX_SIDES
 from flask import (
     Flask,
     render_template,
@@ -10,11 +25,16 @@ from flask import (
     url_for,
     g,
     session,
-    send_file,
+    make_response,
+    Response,
+    stream_with_context,
+    jsonify,
 )
 from dotenv import load_dotenv
 import os
+import db_data_funcs
 from db import get_connection
+from db_cache import bump, cache_info
 
 load_dotenv()
 
@@ -22,12 +42,29 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
 
+# Snapshot of morkborg.sqlite for the generator, reloaded after writes
+_compendium = SharedCompendium(Compendium.from_sqlite)
+
+
+def get_compendium():
+    return _compendium.get()
+
+
+def reset_compendium(*tables):
+    """
+    Call after every commit that changes the compendium `tables`.
+    """
+    _compendium.reset()
+    bump(*tables)
+
+
 VALIDATION_TEXT = {
     "empty": "Значение не может быть пустым",
     "slug": "Только латиница, нижний регистр, слова через _",
     "name": "Только кирриллица, слова разделяются пробелом, никаких символов",
     "desc": "Только кириллица, допускается любая свободная форма, в конце точка",
-    "formula": "Только формат вида XdY/XdY±*Z (3d6/3d6±*2)",
+    "formula": "Только формат вида XdY/XdY±*Z (3d6/3d6±*2), "
+    f"от 1 до {MAX_DICE} костей, не больше {MAX_SIDES} граней",
     "dublicate": "Такой id уже есть в базе!",
     "count": "Только число от 0 до {} (включительно)",
     "or_empty": ". Либо оставьте пустым.",
@@ -42,7 +79,10 @@ def validate_form(slug=None, name=None, describe=None, formula=None, count=None)
     if describe:
         return re.fullmatch(r"^[А-ЯЁ][А-ЯЁа-яёA-Za-z0-9 \.,:;()\-!?+]*\.$", describe)
     if formula:
-        return re.fullmatch(r"(?:(\d*)d)?(\d+)([+\-\*])?(\d+)?", formula)
+        try:
+            return compile_formula(formula)
+        except ValueError:
+            return None
     if count:
         return 0 <= int(count[0]) <= count[1]
 
@@ -77,6 +117,7 @@ def simple_upload_db(db_fragment, table):
                         """,
             tuple(db_fragment.values()),
         )
+    reset_compendium(table)
 
 
 def upload_db_returning(db_fragment, table, class_id):
@@ -102,6 +143,7 @@ def upload_db_returning(db_fragment, table, class_id):
         cursor.execute(
             f"INSERT INTO {'class_' + table} (class_id, {table + '_id'}) VALUES ({class_id}, {element_id});"
         )
+    reset_compendium(table, "class_" + table)
 
 
 def download_all_slugs(table):
@@ -246,10 +288,7 @@ def add_class():
 @app.route("/add_skill", methods=["POST", "GET"])
 def add_skill():
     # CLASSES
-    with get_connection() as con:
-        cursor = con.cursor()
-        cursor.execute("SELECT id, name_ru FROM classes")
-        classes = [dict(row) for row in cursor.fetchall()]
+    classes = db_data_funcs.show_classes_with_id()
 
     if request.method == "GET":
         empty_skill = {"slug": "", "name_ru": "", "desc_ru": ""}
@@ -827,6 +866,7 @@ def confirm_result():
             tuple(session["class"].values()),
         )
     class_id = cursor.lastrowid
+    reset_compendium("classes")
 
     # SKILLS
     for skill in session["skills"]:
@@ -879,38 +919,227 @@ def delete_test():
 
         # Class table third
         cursor.execute("DELETE FROM classes  WHERE slug LIKE 'test_%';")
+    reset_compendium(
+        "class_bonuses",
+        "class_memories",
+        "class_skills",
+        "bonuses",
+        "memories",
+        "skills",
+        "classes",
+    )
 
     return "ok", 200
 
 
+def seeded_character(seed):
+    test = MBCharacter(get_compendium(), seed=seed)
+    test.generate()
+    return dict(test.character.__dict__.items())
+
+
+def render_character(seed, character=None):
+    ch = character or seeded_character(seed)
+    return render_template("character.html", character=ch, seed=seed)
+
+
 @app.route("/generate_character", methods=["GET", "POST"])
 def generate_character():
-    test = MBCharacter()
-    test.generate()
-    ch = dict(test.character.__dict__.items())
+    return redirect(url_for("character_sheet", seed=randrange(SEED_LIMIT)))
 
-    return render_template("character.html", character=ch)
+
+# Code a sheet is generated by, for its ETag
+CHARACTER_SOURCES = ["main_generate.py", "compendium.py", "dice.py"]
+
+
+@app.route("/character/<int:seed>")
+def character_sheet(seed):
+    # <int:> takes any size; a seed past SEED_LIMIT names no character
+    if seed >= SEED_LIMIT:
+        return "No such character", 404
+    compendium = get_compendium()
+    # Same seed, compendium, generator code and template give the same sheet
+    version = source_version(["character.html"], CHARACTER_SOURCES)
+    etag = f"{seed}-{compendium.fingerprint[:16]}-{version}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(render_character(seed))
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    # Revalidated on every use: a deploy changes the ETag, not the URL
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/export_png")
 def export_png():
-    relative_url = request.args.get("url")
-    full_url = f"http://127.0.0.1:8001{relative_url}"
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        # Sheets opened before the seed parameter link with ?url=/character/<seed>
+        match = re.fullmatch(r"/character/(\d+)", request.args.get("url", ""))
+        if match is None:
+            return "seed is required", 400
+        try:
+            seed = parse_seed(match.group(1))
+        except ValueError as e:
+            return str(e), 400
+
+    fmt = request.args.get("format", "png")
+    if fmt not in IMAGE_FORMATS:
+        return f"format must be one of {', '.join(IMAGE_FORMATS)}", 400
+
+    character = seeded_character(seed)
+    key = export_key(character, ["character.html"], variant=fmt)
+    # Rendered here: job workers run outside the request context
+    html = render_character(seed, character)
+    return enqueue_export(key, fmt, lambda: encode_image(sheet_png(html), fmt))
+
+
+@app.route("/export_pdf")
+def export_pdf():
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        return "seed is required", 400
+
+    character = seeded_character(seed)
+    key = export_key(character, [*PDF_PAGES, PDF_TEMPLATE], variant="pdf")
+    html = pdf_document(character)
+    return enqueue_export(key, "pdf", lambda: sheet_pdf(html))
+
+
+def queue_full(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.retry_after = error.retry_after
+    return response
+
+
+def enqueue_export(key, fmt, build):
+    extension = EXPORT_FORMATS[fmt][1]
+    try:
+        job = get_export_queue().submit(
+            f"{key}-{fmt}", key, f"character.{extension}", build
+        )
+    except QueueFull as e:
+        return queue_full(e)
+
+    status = job.as_dict()
+    return jsonify(export_job_json(status)), 200 if status["state"] == "done" else 202
+
+
+def export_job_json(status):
+    return {
+        **status,
+        "status_url": url_for("export_status", job_id=status["id"]),
+        "download_url": url_for("export_download", job_id=status["id"]),
+    }
+
+
+@app.route("/export_jobs/<job_id>")
+def export_status(job_id):
+    status = get_export_queue().status(job_id)
+    if status is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(export_job_json(status))
+
+
+@app.route("/export_jobs/<job_id>/download")
+def export_download(job_id):
+    key, _, fmt = job_id.partition("-")
+    if fmt not in EXPORT_FORMATS:
+        return "unknown job", 404
+    mimetype, extension = EXPORT_FORMATS[fmt]
+
+    if request.if_none_match.contains(key):
+        response = make_response("", 304)
+    else:
+        entry = get_export_cache().lookup(key)
+        if entry is None:
+            status = get_export_queue().status(job_id)
+            if status is None:
+                return "unknown job", 404
+            # Still rendering, or failed and nothing to serve
+            code = 500 if status["state"] == "failed" else 202
+            return jsonify(export_job_json(status)), code
+        # Bytes body: Flask sets Content-Length, nothing touches a temp file
+        response = make_response((entry / f"character.{extension}").read_bytes())
+        response.mimetype = mimetype
+        response.headers["Content-Disposition"] = (
+            f'attachment; filename="character.{extension}"'
+        )
+
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+
+@app.route("/export_metrics")
+def export_metrics():
+    return jsonify(get_export_queue().metrics())
+
+
+@app.route("/db_cache_metrics")
+def db_cache_metrics():
+    return jsonify(cache_info())
 
-    out_path = Path("character.png")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page(viewport={"width": 1200, "height": 1600})
+# One ZIP stream can hold a browser for minutes; keep batches sane
+EXPORT_BATCH_LIMIT = 1000
 
-        page.goto(full_url, wait_until="networkidle")
 
-        sheet = page.locator("#sheet")
-        sheet.screenshot(path=str(out_path))
+@app.route("/export_batch")
+def export_batch():
+    count = request.args.get("count", type=int)
+    if count is None or not 1 <= count <= EXPORT_BATCH_LIMIT:
+        return f"count must be between 1 and {EXPORT_BATCH_LIMIT}", 400
+    seed = request.args.get("seed", type=parse_seed)
+    if seed is None:
+        if "seed" in request.args:
+            return f"seed must be in [0, {SEED_LIMIT})", 400
+        seed = randrange(SEED_LIMIT)
+
+    # Same limit as single exports
+    try:
+        release = get_export_queue().start_batch()
+    except QueueFull as e:
+        return queue_full(e)
+
+    def sheets():
+        for index, character_seed in enumerate(batch_seeds(count, seed), 1):
+            yield f"{index:04d}-{character_seed}.png", render_character(character_seed)
+
+    def stream():
+        try:
+            yield from zip_stream(sheet_pngs(sheets()))
+        finally:
+            release()
+
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="characters-{seed}.zip"'
+        },
+    )
+    # A stream that never starts never reaches the finally above
+    response.call_on_close(release)
+    return response
 
-        browser.close()
 
-    return send_file(out_path, as_attachment=True, download_name="character.png")
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, SEARCH_LIMIT))
+    return jsonify({"query": query, "results": search_sqlite(query, limit)})
 
 
 if __name__ == "__main__":
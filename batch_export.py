@@ -0,0 +1,66 @@
+"""
+Character sheets for a convention table, as one ZIP of PNGs.
+
+    python -m batch_export table.zip --count 40 --seed 7 --sqlite
+
+Same archive as /export_batch?count=40&seed=7: one headless browser renders
+the sheets on several parallel pages, and entries are written to the
+archive as they finish, so memory does not grow with --count.
+"""
+
+import sys
+import argparse
+from random import randrange
+
+from db import DB_PATH
+from compendium import Compendium
+from main_generate import SEED_LIMIT, get_compendium, seed_arg
+from browser_pool import get_browser_pool
+from exports import batch_seeds, render_sheet, sheet_pngs, zip_stream
+
+
+def run(out, count, seed=None, pages=None, compendium=None):
+    """
+    Writes the archive to the binary stream `out`; returns the batch seed.
+    """
+    seed = randrange(SEED_LIMIT) if seed is None else seed
+    compendium = compendium or get_compendium()
+    get_browser_pool(size=pages)
+
+    def sheets():
+        for index, character_seed in enumerate(batch_seeds(count, seed), 1):
+            name = f"{index:04d}-{character_seed}.png"
+            yield name, render_sheet(compendium, character_seed)
+
+    done = 0
+    for chunk in zip_stream(sheet_pngs(sheets())):
+        out.write(chunk)
+        done = min(done + 1, count)
+        print(f"\r{done}/{count}", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch PNG export to a ZIP")
+    parser.add_argument("out", help="ZIP file to write")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--seed", type=seed_arg, default=None)
+    parser.add_argument("--pages", type=int, default=None, help="Parallel pages")
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=DB_PATH,
+        default=None,
+        help="Read the compendium from SQLite instead of Postgres",
+    )
+    args = parser.parse_args()
+
+    compendium = Compendium.from_sqlite(args.sqlite) if args.sqlite else None
+    with open(args.out, "wb") as out:
+        seed = run(out, args.count, args.seed, args.pages, compendium)
+    print(f"Done, seed {seed}")
+
+
+if __name__ == "__main__":
+    main()
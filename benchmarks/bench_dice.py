@@ -0,0 +1,45 @@
+"""
+Per-roll cost of the old regex parser against compiled DicePlans.
+Run from the repo root: python -m benchmarks.bench_dice [rolls]
+"""
+
+import re
+import sys
+import timeit
+import operator as op
+from random import randint
+from dice import compile_formula
+
+OPERATORS = {"+": op.add, "-": op.sub, "//": op.floordiv, "*": op.mul}
+FORMULAS = ("d10", "2d6*10", "d2", "3d6-1", "3d6+2", "3d6", "d4")
+
+
+# MBCharacter.roll_dice before dice.py
+def regex_roll(string):
+    pattern = r"(?:(\d*)d)?(\d+)([+\-*])?(\d+)?"
+    match = re.fullmatch(pattern, string)
+    if match:
+        count, value, operator, bonus = match.groups()
+        count = int(count) if count else 1
+        value = int(value)
+        operator = OPERATORS.get(operator, op.add)
+        bonus = int(bonus) if bonus else 0
+        roll = sum([randint(1, value) for _ in range(count)])
+        return operator(roll, bonus)
+
+
+def compiled_roll(string):
+    return compile_formula(string).roll()
+
+
+def main(rolls=200_000):
+    loops = max(rolls // len(FORMULAS), 1)
+    for name, func in (("regex", regex_roll), ("compiled", compiled_roll)):
+        elapsed = timeit.timeit(
+            lambda: [func(formula) for formula in FORMULAS], number=loops
+        )
+        print(f"{name:9}: {elapsed / (loops * len(FORMULAS)) * 1e9:8.1f} ns/roll")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,85 @@
+"""
+PNG export throughput: a fresh Chromium per export (the old /export_png),
+the shared BrowserPool loading the sheet over HTTP, and the pool rendering
+in-process HTML (exports.sheet_png), sequentially and from concurrent
+clients. Serves app_local on a free port. Run from the repo root:
+
+    python -m benchmarks.bench_export [exports per run]
+"""
+
+import sys
+import time
+import logging
+import threading
+from random import randrange
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import make_server
+from playwright.sync_api import sync_playwright
+
+import browser_pool
+from app_local import app, render_character
+from browser_pool import BrowserPool, VIEWPORT
+from exports import sheet_png
+
+CLIENTS = (1, 4)
+
+
+def launch_per_export(url):
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page(viewport=VIEWPORT)
+        page.goto(url, wait_until="networkidle")
+        png = page.locator("#sheet").screenshot()
+        browser.close()
+    return png
+
+
+def pooled_export(pool):
+    def export(url):
+        async def render(page):
+            await page.goto(url, wait_until="networkidle")
+            return await page.locator("#sheet").screenshot()
+
+        return pool.run(render)
+
+    return export
+
+
+def in_process_export(url):
+    seed = int(url.rsplit("/", 1)[1])
+    with app.test_request_context():
+        html = render_character(seed)
+    return sheet_png(html)
+
+
+def measure(export, base, exports, clients):
+    urls = [f"{base}/character/{randrange(1 << 62)}" for _ in range(exports)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(export, urls))
+    return exports / (time.perf_counter() - start)
+
+
+def main(exports=20):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    pool = browser_pool._pool = BrowserPool(size=max(CLIENTS))
+    try:
+        for clients in CLIENTS:
+            old = measure(launch_per_export, base, exports, clients)
+            pooled = measure(pooled_export(pool), base, exports, clients)
+            local = measure(in_process_export, base, exports, clients)
+            print(
+                f"{clients} clients: launch {old:6.2f}, pool {pooled:6.2f}, "
+                f"in-process {local:6.2f} exports/s"
+            )
+    finally:
+        pool.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
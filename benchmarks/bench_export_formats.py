@@ -0,0 +1,73 @@
+"""
+Bytes on the wire and response latency of /export_png per format, against
+the old path (screenshot written to character.png, then send_file).
+New exports go through the job queue: enqueue, poll, download.
+The browser is left out: sheet_png returns a fixed screenshot, by default
+the sample exports/01.png. Run from the repo root:
+
+    python -m benchmarks.bench_export_formats [screenshot.png] [requests]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+from random import randrange
+from unittest import mock
+from flask import send_file
+
+import app_local
+import export_cache
+from exports import IMAGE_FORMATS
+
+
+def old_export(png):
+    out_path = Path(tempfile.gettempdir()) / "character.png"
+    out_path.write_bytes(png)
+    return send_file(out_path, as_attachment=True, download_name="character.png")
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if url.startswith("/export_png"):
+        # Queued export: poll the job, then download
+        job = response.get_json()
+        while job["state"] in ("queued", "running"):
+            time.sleep(0.001)
+            job = client.get(job["status_url"]).get_json()
+        response = client.get(job["download_url"])
+    return response.get_data()
+
+
+def timed(client, url, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        body = fetch(client, url() if callable(url) else url)
+    return len(body), (time.perf_counter() - start) / requests
+
+
+def main(screenshot="exports/01.png", requests=50):
+    png = Path(screenshot).read_bytes()
+    export_cache._cache = export_cache.ExportCache(tempfile.mkdtemp())
+    app = app_local.app
+    app.add_url_rule("/old_export_png", "old_export_png", lambda: old_export(png))
+    client = app.test_client()
+
+    with mock.patch.object(app_local, "sheet_png", return_value=png):
+        size, latency = timed(client, "/old_export_png", requests)
+        print(f"{'old png':12}: {size:8} bytes, {latency * 1e3:7.2f} ms")
+
+        for fmt in IMAGE_FORMATS:
+            cold = lambda: f"/export_png?seed={randrange(1 << 62)}&format={fmt}"
+            size, miss = timed(client, cold, requests)
+            warm = f"/export_png?seed=1&format={fmt}"
+            fetch(client, warm)
+            _, hit = timed(client, warm, requests)
+            print(
+                f"{fmt:12}: {size:8} bytes, {miss * 1e3:7.2f} ms miss, "
+                f"{hit * 1e3:7.2f} ms hit"
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,32 @@
+"""
+Throughput of MBCharacter.generate() in a loop against generate_many(n).
+Run from the repo root: python -m benchmarks.bench_generate [n]
+"""
+
+import sys
+import time
+import numpy as np
+from compendium import Compendium
+from main_generate import MBCharacter
+
+
+def main(n=100_000):
+    generator = MBCharacter(Compendium.from_sqlite())
+
+    loop_n = max(n // 20, 1)
+    start = time.perf_counter()
+    for _ in range(loop_n):
+        generator.generate()
+    loop = (time.perf_counter() - start) / loop_n
+
+    start = time.perf_counter()
+    batch = generator.generate_many(n, np.random.default_rng())
+    vector = (time.perf_counter() - start) / len(batch)
+
+    print(f"generate()        : {loop * 1e6:8.2f} us/character")
+    print(f"generate_many({n}): {vector * 1e6:8.2f} us/character")
+    print(f"speedup           : {loop / vector:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
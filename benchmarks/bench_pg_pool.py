@@ -0,0 +1,59 @@
+"""
+Throughput of app.py against a local Postgres as client threads grow.
+Needs the DB_* variables from .env. Run from the repo root:
+
+    python -m benchmarks.bench_pg_pool [seconds per run]
+"""
+
+import sys
+import time
+import logging
+import threading
+import urllib.request
+from random import randrange
+from werkzeug.serving import make_server
+
+from app import app
+
+PATHS = {
+    "/character/<seed>": lambda: f"/character/{randrange(1 << 62)}",
+    "/library/items": lambda: "/library/items",
+}
+THREADS = (1, 2, 4, 8)
+
+
+def hammer(base, path, threads, seconds):
+    done = [0] * threads
+    stop = time.monotonic() + seconds
+
+    def worker(index):
+        while time.monotonic() < stop:
+            with urllib.request.urlopen(base + PATHS[path]()) as response:
+                response.read()
+            done[index] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(done) / seconds
+
+
+def main(seconds=3.0):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        for path in PATHS:
+            for threads in THREADS:
+                rate = hammer(base, path, threads, seconds)
+                print(f"{path:20} {threads} threads: {rate:8.1f} req/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0)
@@ -0,0 +1,82 @@
+"""
+Latency of db_data_funcs lookups (their db_cache layer bypassed): a fresh
+sqlite3 connection per call (the old db.get_connection) against the shared
+pool. Every "request" runs on a new thread, as under werkzeug's threaded
+server, with 1..8 requests in flight; each request does two lookups.
+Run from the repo root: python -m benchmarks.bench_sqlite [requests]
+"""
+
+import sys
+import time
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from unittest import mock
+
+import db
+import db_data_funcs
+
+CALLS = (
+    lambda: db_data_funcs.show_all_items.__wrapped__(),
+    lambda: db_data_funcs.show_info_items.__wrapped__("Веревка"),
+)
+THREADS = (1, 4, 8)
+
+
+@contextmanager
+def fresh_connection(readonly=False):
+    with closing(sqlite3.connect(db.DB_PATH)) as con:
+        con.row_factory = sqlite3.Row
+        with con:
+            yield con
+
+
+def request():
+    for call in CALLS:
+        call()
+
+
+def run(requests, in_flight):
+    slots = threading.Semaphore(in_flight)
+    threads = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        slots.acquire()
+
+        def handle():
+            try:
+                request()
+            finally:
+                slots.release()
+
+        thread = threading.Thread(target=handle)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start) / requests
+
+
+def main(requests=2_000):
+    opened = [0]
+    connect = db._connect
+
+    def counting_connect(readonly):
+        opened[0] += 1
+        return connect(readonly)
+
+    for in_flight in THREADS:
+        with mock.patch.object(db_data_funcs, "get_connection", fresh_connection):
+            old = run(requests, in_flight)
+        db.close_connections()
+        opened[0] = 0
+        with mock.patch.object(db, "_connect", counting_connect):
+            new = run(requests, in_flight)
+        print(
+            f"{in_flight} in flight: {old * 1e6:8.1f} us -> {new * 1e6:8.1f} us "
+            f"per request, {opened[0]} connections opened for {requests}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
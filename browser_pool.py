@@ -0,0 +1,147 @@
+"""
+Long-lived headless Chromium shared by every export.
+
+Playwright objects belong to the thread that created them, so the pool
+runs its own asyncio loop on a background thread. It owns one browser
+and a bounded set of warm pages; callers from any thread hand it an
+async job and block on the result:
+
+    async def render(page):
+        await page.goto(url)
+        return await page.locator("#sheet").screenshot()
+
+    png = get_browser_pool().run(render)
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+from dataclasses import dataclass
+
+from playwright.async_api import async_playwright
+
+VIEWPORT = {"width": 1200, "height": 1600}
+
+
+@dataclass
+class _Slot:
+    page: object
+    generation: int
+    uses: int = 0
+
+
+class BrowserPool:
+    def __init__(self, size=2, max_uses=200, timeout=60.0):
+        """
+        size     : Количество страниц, одновременно доступных для рендера;
+        max_uses : После стольких рендеров страница пересоздается;
+        timeout  : Сколько секунд ждать результат одного задания;
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.timeout = timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="browser-pool", daemon=True
+        )
+        self._thread.start()
+        self._call(self._start())
+
+    def _call(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    # region --- POOL THREAD ---
+    async def _start(self):
+        self._playwright = await async_playwright().start()
+        self._browser = None
+        self._generation = 0
+        self._slots = asyncio.Queue()
+        self._restart_lock = asyncio.Lock()
+        await self._launch()
+
+    async def _launch(self):
+        self._generation += 1
+        self._browser = await self._playwright.chromium.launch()
+        for _ in range(self.size):
+            await self._slots.put(await self._new_slot())
+
+    async def _new_slot(self):
+        page = await self._browser.new_page(viewport=VIEWPORT)
+        return _Slot(page, self._generation)
+
+    async def _ensure_browser(self):
+        async with self._restart_lock:
+            if self._browser.is_connected():
+                return
+            # Crashed: pages of the old browser are dropped when handed back
+            while not self._slots.empty():
+                self._slots.get_nowait()
+            await self._launch()
+
+    async def _release(self, slot, failed):
+        if slot.generation != self._generation:
+            return
+        slot.uses += 1
+        if failed or slot.uses >= self.max_uses:
+            try:
+                await slot.page.close()
+            except Exception:
+                pass
+            if not self._browser.is_connected():
+                # The next job restarts the browser and refills the pool
+                return
+            slot = await self._new_slot()
+        await self._slots.put(slot)
+
+    async def _run(self, job):
+        await self._ensure_browser()
+        slot = await self._slots.get()
+        failed = True
+        try:
+            result = await job(slot.page)
+            failed = False
+            return result
+        finally:
+            await self._release(slot, failed)
+
+    async def _stop(self):
+        if self._browser is not None:
+            await self._browser.close()
+        await self._playwright.stop()
+
+    # endregion
+
+    def run(self, job, timeout=None):
+        """
+        Runs `await job(page)` on a free warm page and returns its result.
+        """
+        return self.submit(job).result(timeout or self.timeout)
+
+    def submit(self, job):
+        """
+        Schedules `await job(page)`; returns a concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+
+    def close(self):
+        self._call(self._stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(size=None):
+    """
+    Shared pool; `size` only matters for the call that starts it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(size=size or int(os.getenv("EXPORT_PAGES", 2)))
+            atexit.register(_pool.close)
+    return _pool
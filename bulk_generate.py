@@ -0,0 +1,181 @@
+"""
+Offline generation of large character pools across all CPU cores.
+
+    python -m bulk_generate characters.ndjson --count 1000000 --seed 7
+
+Characters are generated in fixed-size shards. Shard k always uses the
+NumPy stream SeedSequence(seed, spawn_key=(k,)), so the output depends
+only on seed, count and shard size - not on the number of workers or on
+how many times the run was interrupted. Finished shards are recorded in
+<out>.parts/checkpoint.json; re-running the same command resumes there.
+"""
+
+import os
+import json
+import argparse
+from pathlib import Path
+from random import randrange
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from db import DB_PATH
+from compendium import Compendium
+from main_generate import (
+    MBCharacter,
+    SEED_LIMIT,
+    seed_arg,
+    character_json,
+    get_compendium,
+)
+
+SHARD_SIZE = 10_000
+
+_generator = None
+
+
+def _init_worker(compendium):
+    global _generator
+    _generator = MBCharacter(compendium)
+
+
+def _write_shard(parts_dir, seed, index, size):
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    batch = _generator.generate_many(size, rng)
+
+    path = parts_dir / f"shard-{index:06d}.ndjson"
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for character in batch:
+            f.write(character_json(character))
+            f.write("\n")
+    os.replace(tmp, path)
+    return index
+
+
+def _save_checkpoint(path, checkpoint):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(path, count, seed, shard_size, fingerprint):
+    if not path.exists():
+        return {
+            "count": count,
+            "seed": seed if seed is not None else randrange(SEED_LIMIT),
+            "shard_size": shard_size,
+            "compendium": fingerprint,
+            "done": [],
+        }
+
+    checkpoint = json.loads(path.read_text(encoding="utf-8"))
+    if checkpoint["count"] != count or checkpoint["shard_size"] != shard_size:
+        raise ValueError(f"{path} belongs to a run with other count or shard size")
+    if seed is not None and checkpoint["seed"] != seed:
+        raise ValueError(f"{path} belongs to a run with seed {checkpoint['seed']}")
+    # Shards drawn from two compendium versions must not end up in one file
+    if checkpoint.get("compendium") != fingerprint:
+        raise ValueError(f"{path} belongs to a run over another compendium")
+    return checkpoint
+
+
+def _merge(parts_dir, out_path, shards):
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        for index in range(shards):
+            with open(parts_dir / f"shard-{index:06d}.ndjson", "rb") as part:
+                while chunk := part.read(1 << 20):
+                    out.write(chunk)
+    os.replace(tmp, out_path)
+
+    for part in parts_dir.iterdir():
+        part.unlink()
+    parts_dir.rmdir()
+
+
+def run(
+    out_path, count, seed=None, workers=None, shard_size=SHARD_SIZE, compendium=None
+):
+    """
+    Generates count characters into out_path as NDJSON and returns the seed used.
+    """
+    if shard_size < 1:
+        raise ValueError("shard_size must be at least 1")
+    compendium = compendium if compendium is not None else get_compendium()
+
+    out_path = Path(out_path)
+    parts_dir = out_path.with_name(out_path.name + ".parts")
+    parts_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint_path = parts_dir / "checkpoint.json"
+    checkpoint = _load_checkpoint(
+        checkpoint_path, count, seed, shard_size, compendium.fingerprint
+    )
+    _save_checkpoint(checkpoint_path, checkpoint)
+
+    shards = -(-count // shard_size)
+    done = {
+        index
+        for index in checkpoint["done"]
+        if (parts_dir / f"shard-{index:06d}.ndjson").exists()
+    }
+    todo = [index for index in range(shards) if index not in done]
+    if done:
+        print(f"Resuming: {len(done)}/{shards} shards already done")
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(compendium,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                _write_shard,
+                parts_dir,
+                checkpoint["seed"],
+                index,
+                min(shard_size, count - index * shard_size),
+            )
+            for index in todo
+        ]
+        for future in as_completed(futures):
+            done.add(future.result())
+            checkpoint["done"] = sorted(done)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            print(f"{len(done)}/{shards} shards")
+
+    _merge(parts_dir, out_path, shards)
+    return checkpoint["seed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk character generation")
+    parser.add_argument("out", help="NDJSON file to write")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--seed", type=seed_arg, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=DB_PATH,
+        default=None,
+        help="Read the compendium from SQLite instead of Postgres",
+    )
+    args = parser.parse_args()
+    if args.shard_size < 1:
+        parser.error("--shard-size must be at least 1")
+
+    compendium = Compendium.from_sqlite(args.sqlite) if args.sqlite else None
+    seed = run(
+        args.out,
+        args.count,
+        seed=args.seed,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        compendium=compendium,
+    )
+    print(f"Done, seed {seed}")
+
+
+if __name__ == "__main__":
+    main()
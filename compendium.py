@@ -0,0 +1,149 @@
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from collections import defaultdict
+from db import DB_PATH
+
+# Tables copied into the snapshot as {id: row}
+ROW_TABLES = ("classes", "bonuses", "skills", "memories", "armors", "weapons")
+# Tables copied into the snapshot as {category: [row, ...]}
+CATEGORY_TABLES = ("narrative", "items")
+# Link tables copied into the snapshot as {class_id: [linked_id, ...]}
+LINK_TABLES = {
+    "class_bonuses": "bonuses_id",
+    "class_skills": "skills_id",
+    "class_memories": "memories_id",
+}
+
+
+def _fetch_rows(cursor, query):
+    cursor.execute(query)
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+@dataclass
+class Compendium:
+    """
+    In-process copy of every table MBCharacter draws from.
+    Built once, then used for any number of characters without touching the DB.
+    """
+
+    classes: dict = field(default_factory=dict)
+    bonuses: dict = field(default_factory=dict)
+    skills: dict = field(default_factory=dict)
+    memories: dict = field(default_factory=dict)
+    armors: dict = field(default_factory=dict)
+    weapons: dict = field(default_factory=dict)
+
+    narrative: dict = field(default_factory=dict)
+    items: dict = field(default_factory=dict)
+
+    class_bonuses: dict = field(default_factory=dict)
+    class_skills: dict = field(default_factory=dict)
+    class_memories: dict = field(default_factory=dict)
+
+    # Hash of everything above; changes whenever the compendium does
+    fingerprint: str = ""
+
+    # Dense sampling indexes built from the tables above by build_indexes(),
+    # so every draw is one random integer and one lookup
+    class_ids: list = field(default_factory=list, repr=False)
+    armor_ids: list = field(default_factory=list, repr=False)
+    weapon_ids: list = field(default_factory=list, repr=False)
+    # The same indexes as NumPy arrays for batch draws
+    arrays: dict = field(default_factory=dict, repr=False)
+
+    def build_indexes(self):
+        self.class_ids = sorted(self.classes)
+        self.armor_ids = sorted(self.armors)
+        self.weapon_ids = sorted(self.weapons)
+        self.arrays = {
+            "class_ids": np.array(self.class_ids, dtype=np.int64),
+            "armor_ids": np.array(self.armor_ids, dtype=np.int64),
+            "weapon_ids": np.array(self.weapon_ids, dtype=np.int64),
+        }
+        for table in LINK_TABLES:
+            self.arrays[table] = {
+                class_id: np.array(ids, dtype=np.int64)
+                for class_id, ids in getattr(self, table).items()
+            }
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        snapshot = cls()
+
+        for table in ROW_TABLES:
+            rows = _fetch_rows(cursor, f"SELECT * FROM {table} ORDER BY id;")
+            setattr(snapshot, table, {row["id"]: row for row in rows})
+
+        for table in CATEGORY_TABLES:
+            grouped = defaultdict(list)
+            for row in _fetch_rows(cursor, f"SELECT * FROM {table} ORDER BY id;"):
+                grouped[row["category"]].append(row)
+            setattr(snapshot, table, dict(grouped))
+
+        for table, column in LINK_TABLES.items():
+            # Links to rows that no longer exist are dropped here,
+            # so every id in the snapshot can be looked up safely
+            target = getattr(snapshot, column.removesuffix("_id"))
+            grouped = defaultdict(list)
+            rows = _fetch_rows(
+                cursor, f"SELECT class_id, {column} FROM {table} ORDER BY class_id;"
+            )
+            for row in rows:
+                if row[column] in target:
+                    grouped[row["class_id"]].append(row[column])
+            setattr(snapshot, table, dict(grouped))
+
+        tables = ROW_TABLES + CATEGORY_TABLES + tuple(LINK_TABLES)
+        content = repr([getattr(snapshot, table) for table in tables])
+        snapshot.fingerprint = hashlib.sha1(content.encode()).hexdigest()
+        snapshot.build_indexes()
+        return snapshot
+
+    @classmethod
+    def from_postgres(cls, connection):
+        with connection:
+            with connection.cursor() as cursor:
+                return cls.from_cursor(cursor)
+
+    @classmethod
+    def from_sqlite(cls, path=DB_PATH):
+        con = sqlite3.connect(path)
+        try:
+            return cls.from_cursor(con.cursor())
+        finally:
+            con.close()
+
+
+class SharedCompendium:
+    """
+    One Compendium for every thread, built on first use by `load()` and
+    dropped by reset() after a write. A build that a reset overlapped is
+    handed to its caller but not kept: it may predate the write.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._compendium = None
+        self._generation = 0
+
+    def get(self):
+        with self._lock:
+            if self._compendium is not None:
+                return self._compendium
+            generation = self._generation
+        compendium = self._load()
+        with self._lock:
+            if self._generation == generation and self._compendium is None:
+                self._compendium = compendium
+        return compendium
+
+    def reset(self):
+        with self._lock:
+            self._generation += 1
+            self._compendium = None
@@ -1,9 +1,75 @@
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 
 DB_PATH = "morkborg.sqlite"
+# Prepared statements kept per connection (sqlite3 default is 128)
+STATEMENT_CACHE = 256
+# Idle connections kept per database and mode; extra ones opened under load
+# are closed when handed back
+POOL_SIZE = 4
 
+# (path, readonly) -> queue of idle connections, shared by all threads
+_pools = {}
+_pools_lock = threading.Lock()
 
-def get_connection():
-    con = sqlite3.connect(DB_PATH)
+
+def _connect(readonly):
+    # Checked out by one thread at a time, but not always the one that opened it
+    if readonly:
+        con = sqlite3.connect(
+            f"file:{DB_PATH}?mode=ro",
+            uri=True,
+            cached_statements=STATEMENT_CACHE,
+            check_same_thread=False,
+        )
+    else:
+        con = sqlite3.connect(
+            DB_PATH, cached_statements=STATEMENT_CACHE, check_same_thread=False
+        )
     con.row_factory = sqlite3.Row
     return con
+
+
+def _pool(readonly):
+    with _pools_lock:
+        return _pools.setdefault((DB_PATH, readonly), queue.LifoQueue(POOL_SIZE))
+
+
+@contextmanager
+def get_connection(readonly=False):
+    """
+    `with get_connection() as con:` checks a connection out of a small
+    shared pool, commits or rolls back on exit and hands it back.
+    Read-only callers get mode=ro connections that cannot write.
+    """
+    pool = _pool(readonly)
+    try:
+        con = pool.get_nowait()
+    except queue.Empty:
+        con = _connect(readonly)
+    try:
+        with con:
+            yield con
+    finally:
+        if con.in_transaction:
+            con.rollback()
+        try:
+            pool.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+
+def close_connections():
+    """
+    Closes the idle pooled connections, e.g. before replacing the file.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
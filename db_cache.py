@@ -0,0 +1,110 @@
+"""
+Read-through cache for the compendium lookups of db_data_funcs.
+
+The compendium changes only through the add_* forms, so lookups are kept in
+memory and served until a table they read changes:
+
+- writes in this process call bump(table, ...), which moves only those
+  tables' versions;
+- commits from other processes (the Flask app while the GUI is open) are
+  seen through PRAGMA data_version and drop the whole cache.
+
+Cached values are shared between callers, like functools.lru_cache: do not
+modify them.
+"""
+
+import sqlite3
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+import db
+
+MAX_ENTRIES = 1024
+
+_lock = threading.Lock()
+# (function, args) -> (stamp, value), least recently used first
+_entries = OrderedDict()
+_versions = {}
+_epoch = 0
+_probe = None
+_data_version = None
+_stats = {"hits": 0, "misses": 0, "bumps": 0, "flushes": 0}
+
+
+def _check_data_version():
+    # One connection for every thread: data_version is per connection
+    global _probe, _data_version, _epoch
+    if _probe is None:
+        _probe = sqlite3.connect(
+            f"file:{db.DB_PATH}?mode=ro", uri=True, check_same_thread=False
+        )
+    version = _probe.execute("PRAGMA data_version").fetchone()[0]
+    if _data_version is not None and version != _data_version:
+        _epoch += 1
+        _stats["flushes"] += 1
+        _entries.clear()
+    _data_version = version
+
+
+def _stamp(tables):
+    return (_epoch, *(_versions.get(table, 0) for table in tables))
+
+
+def bump(*tables):
+    """
+    Call after a commit that changes `tables`: their lookups are dropped.
+    """
+    global _data_version
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+        _stats["bumps"] += 1
+        # Our own commit moved data_version too; it is already accounted for
+        if _probe is not None:
+            _data_version = _probe.execute("PRAGMA data_version").fetchone()[0]
+
+
+def cached(*tables):
+    """
+    Decorator for a lookup that reads `tables`.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            key = (func.__qualname__, args)
+            with _lock:
+                _check_data_version()
+                stamp = _stamp(tables)
+                entry = _entries.get(key)
+                if entry is not None and entry[0] == stamp:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return entry[1]
+                _stats["misses"] += 1
+
+            value = func(*args)
+
+            with _lock:
+                # A write during the query leaves the value unstamped for later
+                if _stamp(tables) == stamp:
+                    _entries[key] = (stamp, value)
+                    _entries.move_to_end(key)
+                    while len(_entries) > MAX_ENTRIES:
+                        _entries.popitem(last=False)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def cache_info():
+    with _lock:
+        return {**_stats, "size": len(_entries), "max_entries": MAX_ENTRIES}
+
+
+def clear():
+    with _lock:
+        _entries.clear()
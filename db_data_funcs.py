@@ -1,10 +1,12 @@
 import sqlite3
 from db import get_connection
+from db_cache import cached
 
 
 # Helpfull func to take classes id
+@cached("classes")
 def select_class_id(cls):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             "SELECT id FROM classes WHERE name_ru=?",
@@ -14,15 +16,25 @@ def select_class_id(cls):
 
 
 # CLASSES
+@cached("classes")
 def show_all_classes():
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute("SELECT name_ru FROM classes;")
         return [dict(i) for i in cursor.fetchall()]
 
 
+@cached("classes")
+def show_classes_with_id():
+    with get_connection(readonly=True) as con:
+        cursor = con.cursor()
+        cursor.execute("SELECT id, name_ru FROM classes")
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@cached("classes")
 def show_info_classes(cls):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             "SELECT name_ru, desc_ru, hp_formula FROM classes WHERE name_ru=?;", (cls,)
@@ -31,15 +43,17 @@ def show_info_classes(cls):
 
 
 # region ITEMS
+@cached("items")
 def show_all_items():
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute("SELECT DISTINCT name_ru FROM items;")
         return [dict(i) for i in cursor.fetchall()]
 
 
+@cached("items")
 def show_info_items(item):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             """
@@ -56,15 +70,17 @@ def show_info_items(item):
 
 
 # region ARMORS
+@cached("armors")
 def show_all_armors():
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute("SELECT DISTINCT name_ru FROM armors;")
         return [dict(i) for i in cursor.fetchall()]
 
 
+@cached("armors")
 def show_info_armor(armor):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             """
@@ -81,15 +97,17 @@ def show_info_armor(armor):
 
 
 # region WEAPONS
+@cached("weapons")
 def show_all_weapons():
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute("SELECT DISTINCT name_ru FROM weapons;")
         return [dict(i) for i in cursor.fetchall()]
 
 
+@cached("weapons")
 def show_info_weapons(weapon):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             """
@@ -106,15 +124,17 @@ def show_info_weapons(weapon):
 
 
 # region SKILLS
+@cached("skills")
 def show_all_skills():
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute("SELECT DISTINCT name_ru FROM skills;")
         return [dict(i) for i in cursor.fetchall()]
 
 
+@cached("skills")
 def show_info_skill(skill):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             """
@@ -131,27 +151,27 @@ def show_info_skill(skill):
 
 
 # region BONUSES
+@cached("bonuses", "class_bonuses", "classes")
 def show_all_bonuses(cls):
-    cls_id = select_class_id(cls)
-
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
-            "SELECT bonuses_id FROM class_bonuses WHERE class_id=?",
-            (cls_id,),
-        )
-        bonus_ids = [dict(i)["bonuses_id"] for i in cursor.fetchall()]
-        placeholders = ",".join(["?"] * len(bonus_ids))
-
-        cursor.execute(
-            f"SELECT name_ru FROM bonuses WHERE id IN ({placeholders})",
-            tuple(bonus_ids),
+            """
+            SELECT b.name_ru
+            FROM bonuses b
+            JOIN class_bonuses cb ON cb.bonuses_id = b.id
+            JOIN classes c ON c.id = cb.class_id
+            WHERE c.name_ru=?
+            ORDER BY b.id
+            """,
+            (cls,),
         )
         return [row["name_ru"] for row in cursor.fetchall()]
 
 
+@cached("bonuses")
 def show_info_bonuses(bonus):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursror = con.cursor()
         cursror.execute(
             "SELECT name_ru, desc_ru FROM bonuses WHERE name_ru=?",
@@ -164,27 +184,27 @@ def show_info_bonuses(bonus):
 
 
 # region MEMORIES
+@cached("memories", "class_memories", "classes")
 def show_all_memories(cls):
-    cls_id = select_class_id(cls)
-
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
-            "SELECT memories_id FROM class_memories WHERE class_id=?",
-            (cls_id,),
-        )
-        memories_ids = [dict(i)["memories_id"] for i in cursor.fetchall()]
-        placeholders = ",".join(["?"] * len(memories_ids))
-
-        cursor.execute(
-            f"SELECT name_ru FROM memories WHERE id IN ({placeholders})",
-            tuple(memories_ids),
+            """
+            SELECT m.name_ru
+            FROM memories m
+            JOIN class_memories cm ON cm.memories_id = m.id
+            JOIN classes c ON c.id = cm.class_id
+            WHERE c.name_ru=?
+            ORDER BY m.id
+            """,
+            (cls,),
         )
         return [row["name_ru"] for row in cursor.fetchall()]
 
 
+@cached("memories")
 def show_info_memories(memorie):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursror = con.cursor()
         cursror.execute(
             "SELECT name_ru, desc_ru FROM memories WHERE name_ru=?",
@@ -197,8 +217,9 @@ def show_info_memories(memorie):
 
 
 # region NARRATIVE
+@cached("narrative")
 def show_all_narratives(ctg):
-    with get_connection() as con:
+    with get_connection(readonly=True) as con:
         cursor = con.cursor()
         cursor.execute(
             "SELECT text_ru FROM narrative WHERE category=?",
@@ -0,0 +1,137 @@
+import re
+import numpy as np
+import operator as op
+from dataclasses import dataclass, field
+from functools import lru_cache
+import random
+
+OPERATORS = {"+": op.add, "-": op.sub, "//": op.floordiv, "*": op.mul}
+DICE_PATTERN = re.compile(r"(?:(\d*)d)?(\d+)([+\-*])?(\d+)?")
+# Formulas come from forms: distribution() convolves count dice of
+# sides points, so both are bounded (at most 10 000 outcomes)
+MAX_DICE = 100
+MAX_SIDES = 100
+
+
+@dataclass(frozen=True)
+class DicePlan:
+    """
+    count    : Количество костей, число;
+    sides    : Количество граней, число;
+    operator : Операция над суммой, строка из OPERATORS;
+    bonus    : Второй операнд, число;
+    """
+
+    count: int
+    sides: int
+    operator: str
+    bonus: int
+    apply: object = field(repr=False, compare=False, default=None)
+
+    def roll(self, rng=random):
+        randint = rng.randint
+        if self.count == 1:
+            return self.apply(randint(1, self.sides), self.bonus)
+        sides = self.sides
+        return self.apply(
+            sum([randint(1, sides) for _ in range(self.count)]), self.bonus
+        )
+
+    def roll_many(self, size, rng):
+        roll = rng.integers(1, self.sides + 1, size=(size, self.count)).sum(axis=1)
+        return self.apply(roll, self.bonus)
+
+
+@lru_cache(maxsize=256)
+def compile_formula(formula):
+    """
+    Parses an XdY / XdY±*Z formula once. Raises ValueError on anything
+    the generator could not roll.
+    """
+    match = DICE_PATTERN.fullmatch(formula or "")
+    if not match:
+        raise ValueError(f"Invalid dice formula: {formula!r}")
+
+    count, sides, operator, bonus = match.groups()
+    count = int(count) if count else 1
+    sides = int(sides)
+    operator = operator or "+"
+    bonus = int(bonus) if bonus else 0
+    if sides < 1:
+        raise ValueError(f"Dice need at least one side: {formula!r}")
+    if not 1 <= count <= MAX_DICE:
+        raise ValueError(f"From 1 to {MAX_DICE} dice: {formula!r}")
+    if sides > MAX_SIDES:
+        raise ValueError(f"At most {MAX_SIDES} sides: {formula!r}")
+
+    return DicePlan(count, sides, operator, bonus, OPERATORS[operator])
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    values : Все возможные результаты формулы, по возрастанию;
+    probs  : Вероятность каждого результата;
+    """
+
+    values: np.ndarray
+    probs: np.ndarray
+
+    @property
+    def mean(self):
+        return float(self.values @ self.probs)
+
+    def percentile(self, q):
+        cdf = np.cumsum(self.probs)
+        index = min(np.searchsorted(cdf, q / 100 - 1e-12), len(cdf) - 1)
+        return int(self.values[index])
+
+
+@lru_cache(maxsize=256)
+def distribution(formula):
+    """
+    Exact distribution of a formula: the pmf of one die convolved
+    count times, then mapped through the operator.
+    """
+    plan = compile_formula(formula)
+
+    die = np.full(plan.sides, 1 / plan.sides)
+    pmf = np.ones(1)
+    for _ in range(plan.count):
+        pmf = np.convolve(pmf, die)
+    sums = np.arange(plan.count, plan.count * plan.sides + 1)
+
+    # Floor division can map several sums onto one value
+    values, inverse = np.unique(plan.apply(sums, plan.bonus), return_inverse=True)
+    probs = np.zeros(len(values))
+    np.add.at(probs, inverse, pmf)
+
+    values.setflags(write=False)
+    probs.setflags(write=False)
+    return Distribution(values, probs)
+
+
+@lru_cache(maxsize=256)
+def summarize(formula):
+    """
+    Mean, percentiles and histogram bars of a formula, ready for templates.
+    """
+    dist = distribution(formula)
+    peak = dist.probs.max()
+    return {
+        "formula": formula,
+        "mean": round(dist.mean, 2),
+        "min": int(dist.values[0]),
+        "p10": dist.percentile(10),
+        "p50": dist.percentile(50),
+        "p90": dist.percentile(90),
+        "max": int(dist.values[-1]),
+        "histogram": [
+            {
+                "value": int(value),
+                "percent": round(float(prob) * 100, 1),
+                "height": round(float(prob / peak) * 100),
+            }
+            for value, prob in zip(dist.values, dist.probs)
+        ],
+    }
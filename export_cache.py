@@ -0,0 +1,237 @@
+"""
+Content-addressed cache of rendered exports.
+
+An entry is a folder `exports/<key>/` holding the files of one export
+(`character.png` from Flask, `01.png`..`05.png` from the GUI). The key
+hashes the character and the templates/static files it is drawn with, so
+the same character is never rendered twice. Entries are built in a hidden
+staging folder and renamed into place, so readers never see half-written
+files. The total size is bounded; the least recently used entries go first.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from functools import lru_cache
+from collections import OrderedDict
+
+REPO_ROOT = Path(__file__).resolve().parent
+TEMPLATES_DIR = REPO_ROOT / "templates"
+STATIC_DIR = REPO_ROOT / "static"
+EXPORT_DIR = REPO_ROOT / "exports"
+KEY_LENGTH = 32
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime_ns, size):
+    return hashlib.sha256(Path(path).read_bytes()).digest()
+
+
+def _digest(path):
+    stat = path.stat()
+    return _file_digest(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def export_key(character, templates, variant=""):
+    """
+    Key for `character` drawn with the given templates and current static files.
+    `variant` separates outputs of the same drawing, e.g. image formats.
+    """
+    digest = hashlib.sha256(variant.encode())
+    digest.update(
+        json.dumps(character, sort_keys=True, ensure_ascii=False, default=str).encode()
+    )
+    for name in templates:
+        digest.update(name.encode())
+        digest.update(_digest(TEMPLATES_DIR / name))
+    for path in sorted(STATIC_DIR.rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(STATIC_DIR)).encode())
+            digest.update(_digest(path))
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+def source_version(templates, sources=()):
+    """
+    Digest of the templates and repo files (e.g. modules) a page is made
+    from, for ETags: it changes with any edit or deploy of them.
+    """
+    digest = hashlib.sha256()
+    paths = [TEMPLATES_DIR / name for name in templates]
+    paths += [REPO_ROOT / name for name in sources]
+    for path in paths:
+        digest.update(path.name.encode())
+        digest.update(_digest(path))
+    return digest.hexdigest()[:16]
+
+
+def _entry_size(path):
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def _is_key(name):
+    return len(name) == KEY_LENGTH and all(c in "0123456789abcdef" for c in name)
+
+
+class ExportCache:
+    def __init__(self, root=EXPORT_DIR, max_bytes=256 * 1024 * 1024):
+        """
+        root      : Папка с экспортами, по подпапке на ключ;
+        max_bytes : Предельный общий размер записей, старые удаляются;
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.staging = self.root / ".staging"
+        self.staging.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._building = {}
+        # key -> size, least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        self._scan()
+
+    def _scan(self):
+        found = [
+            (path.stat().st_mtime, path.name, _entry_size(path))
+            for path in self.root.iterdir()
+            if path.is_dir() and _is_key(path.name)
+        ]
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+
+    def path(self, key):
+        return self.root / key
+
+    def lookup(self, key):
+        """
+        Entry folder for `key`, or None if it is not cached.
+        """
+        path = self.path(key)
+        with self._lock:
+            if key not in self._entries:
+                # Built by another process sharing the folder
+                if not path.is_dir():
+                    return None
+                self._add(key, _entry_size(path))
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process
+            with self._lock:
+                self._forget(key)
+            return None
+        return path
+
+    def stage(self):
+        """
+        Fresh staging folder; fill it and pass it to commit().
+        """
+        path = self.staging / uuid.uuid4().hex
+        path.mkdir()
+        return path
+
+    def commit(self, key, staged):
+        path = self.path(key)
+        try:
+            os.rename(staged, path)
+        except OSError:
+            # Someone committed the same key first; theirs is identical
+            shutil.rmtree(staged, ignore_errors=True)
+            if not path.is_dir():
+                raise
+        with self._lock:
+            if key not in self._entries:
+                self._add(key, _entry_size(path))
+            self._entries.move_to_end(key)
+            self._evict()
+        return path
+
+    def discard(self, staged):
+        """
+        Drops a staging folder that will not be committed, e.g. after a
+        failed render, so no partial entry is ever left behind.
+        """
+        shutil.rmtree(staged, ignore_errors=True)
+
+    def store(self, key, files):
+        """
+        Writes {filename: bytes} as the entry for `key`.
+        """
+        staged = self.stage()
+        for name, data in files.items():
+            (staged / name).write_bytes(data)
+        return self.commit(key, staged)
+
+    def read_or_create(self, key, name, build):
+        """
+        Bytes of the single-file entry `name`; on a miss `build()` returns
+        them and they are stored, but served from memory.
+        """
+        path = self.lookup(key)
+        if path is not None:
+            try:
+                return (path / name).read_bytes()
+            except FileNotFoundError:
+                pass
+
+        built = []
+
+        def build_files():
+            built.append(build())
+            return {name: built[0]}
+
+        path = self.get_or_create(key, build_files)
+        return built[0] if built else (path / name).read_bytes()
+
+    def get_or_create(self, key, build):
+        """
+        Entry for `key`; on a miss `build()` returns the files to store.
+        Concurrent misses on one key build it once.
+        """
+        path = self.lookup(key)
+        if path is not None:
+            return path
+
+        with self._lock:
+            lock = self._building.setdefault(key, threading.Lock())
+        with lock:
+            path = self.lookup(key)
+            if path is None:
+                path = self.store(key, build())
+        with self._lock:
+            self._building.pop(key, None)
+        return path
+
+    def _add(self, key, size):
+        self._entries[key] = size
+        self._total += size
+
+    def _forget(self, key):
+        self._total -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        # The newest entry stays even if it alone is over the limit
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            shutil.rmtree(self.path(key), ignore_errors=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            limit = int(os.getenv("EXPORT_CACHE_MB", 256))
+            _cache = ExportCache(max_bytes=limit * 1024 * 1024)
+    return _cache
@@ -0,0 +1,217 @@
+"""
+Bounded queue of export renders.
+
+/export_png only enqueues: the job id comes back at once and the client
+polls its status, then downloads the result from the export cache. A fixed
+number of workers render, and at most `max_pending` jobs wait or run; past
+that, submit() raises QueueFull and the caller answers 503 + Retry-After.
+Batch ZIP streams render in the request instead, but take their share of
+the same limit through start_batch().
+
+A job id is the export cache key plus the format, so asking again for the
+same sheet joins the existing job, and a cached sheet is done immediately.
+"""
+
+import os
+import time
+import math
+import threading
+from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from export_cache import get_export_cache
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Export queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class ExportJob:
+    id: str
+    state: str
+    created: float
+    started: float = None
+    finished: float = None
+    error: str = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "wait_ms": _ms(self.created, self.started),
+            "render_ms": _ms(self.started, self.finished),
+            "error": self.error,
+        }
+
+
+def _ms(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 1)
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+class ExportQueue:
+    def __init__(self, workers=2, max_pending=16, keep=512):
+        """
+        workers     : Сколько экспортов рендерится одновременно;
+        max_pending : Предел ожидающих и выполняемых заданий, дальше 503;
+        keep        : Сколько завершенных заданий помнить для статуса;
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep = keep
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._running = 0
+        self._batches = 0
+        # Recent timings in seconds, for metrics and Retry-After
+        self._waits = deque(maxlen=256)
+        self._renders = deque(maxlen=256)
+        self._counts = {"submitted": 0, "cached": 0, DONE: 0, FAILED: 0, "rejected": 0}
+
+    def submit(self, job_id, key, name, build):
+        """
+        Job that stores `build()` as file `name` of cache entry `key`.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.state != FAILED:
+                return job
+
+        now = time.monotonic()
+        if get_export_cache().lookup(key) is not None:
+            job = ExportJob(job_id, DONE, now, now, now)
+            with self._lock:
+                self._counts["cached"] += 1
+                self._remember(job)
+            return job
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.state != FAILED:
+                return job
+            if self._pending >= self.max_pending:
+                self._counts["rejected"] += 1
+                raise QueueFull(self._retry_after())
+            job = ExportJob(job_id, QUEUED, now)
+            self._pending += 1
+            self._counts["submitted"] += 1
+            self._remember(job)
+        self._executor.submit(self._work, job, key, name, build)
+        return job
+
+    def _work(self, job, key, name, build):
+        with self._lock:
+            job.state = RUNNING
+            job.started = time.monotonic()
+            self._running += 1
+            self._waits.append(job.started - job.created)
+        try:
+            get_export_cache().read_or_create(key, name, build)
+            state, error = DONE, None
+        except Exception as e:
+            state, error = FAILED, str(e)
+        with self._lock:
+            job.finished = time.monotonic()
+            job.state, job.error = state, error
+            self._running -= 1
+            self._pending -= 1
+            self._counts[state] += 1
+            self._renders.append(job.finished - job.started)
+
+    def start_batch(self):
+        """
+        Admits one batch stream, rendered by the caller rather than the
+        workers. A batch keeps every browser page busy, so it counts as
+        `workers` running jobs and only one runs at a time; QueueFull
+        otherwise. Returns the function that frees the slot; calling it
+        again does nothing.
+        """
+        with self._lock:
+            if self._batches or self._pending + self.workers > self.max_pending:
+                self._counts["rejected"] += 1
+                raise QueueFull(self._retry_after())
+            self._batches += 1
+            self._pending += self.workers
+            self._running += self.workers
+        released = threading.Event()
+
+        def release():
+            with self._lock:
+                if released.is_set():
+                    return
+                released.set()
+                self._batches -= 1
+                self._pending -= self.workers
+                self._running -= self.workers
+
+        return release
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        while len(self._jobs) > self.keep:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.state in (QUEUED, RUNNING):
+                break
+            self._jobs.popitem(last=False)
+
+    def _retry_after(self):
+        # Seconds until the jobs ahead should be through, at least 1
+        render = sum(self._renders) / len(self._renders) if self._renders else 5
+        return max(1, math.ceil(render * self._pending / self.workers))
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.as_dict()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "batches": self._batches,
+                **self._counts,
+                "wait_ms": {
+                    "p50": _percentile(self._waits, 0.5),
+                    "p95": _percentile(self._waits, 0.95),
+                },
+                "render_ms": {
+                    "p50": _percentile(self._renders, 0.5),
+                    "p95": _percentile(self._renders, 0.95),
+                },
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_export_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ExportQueue(
+                workers=int(os.getenv("EXPORT_PAGES", 2)),
+                max_pending=int(os.getenv("EXPORT_QUEUE", 16)),
+            )
+    return _queue
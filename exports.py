@@ -0,0 +1,186 @@
+"""
+Character sheet exports rendered from in-process HTML.
+
+The sheet is rendered with Jinja by the caller and handed to a pooled
+page directly, so Chromium never calls back into the Flask server. Page
+requests go to a private origin: "/" answers with the given HTML and
+"/static/..." is served from the local static folder.
+"""
+
+import io
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from collections import deque
+from urllib.parse import urlsplit, unquote
+from jinja2 import Environment, FileSystemLoader
+from PIL import Image
+
+from browser_pool import get_browser_pool
+from pdf_export import READY_SELECTOR as PDF_READY
+from main_generate import MBCharacter, SEED_LIMIT, batch_seeds
+
+STATIC_DIR = (Path(__file__).parent / "static").resolve()
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+ORIGIN = "http://export.local"
+# Set by the sheet template once its images and fonts are decoded
+READY_SELECTOR = "#sheet[data-ready]"
+
+# format -> (mimetype, extension); png is the raw screenshot
+IMAGE_FORMATS = {
+    "png": ("image/png", "png"),
+    "png8": ("image/png", "png"),
+    "webp": ("image/webp", "webp"),
+}
+# The sheet is black, white and antialiasing greys
+PALETTE_COLORS = 16
+# Everything an export job can produce
+EXPORT_FORMATS = {**IMAGE_FORMATS, "pdf": ("application/pdf", "pdf")}
+
+
+def _static_file(url):
+    path = unquote(urlsplit(url).path)
+    if "/static/" not in path:
+        return None
+    local = (STATIC_DIR / path.split("/static/", 1)[1]).resolve()
+    if not local.is_relative_to(STATIC_DIR) or not local.is_file():
+        return None
+    return local
+
+
+async def open_sheet(page, html, path="/", ready=READY_SELECTOR):
+    """
+    Loads `html` into `page` as ORIGIN + `path` and waits for `ready`.
+    """
+    document = ORIGIN + path
+
+    async def serve(route):
+        url = route.request.url
+        if url == document:
+            await route.fulfill(body=html, content_type="text/html; charset=utf-8")
+        elif local := _static_file(url):
+            await route.fulfill(path=local)
+        else:
+            await route.fulfill(status=404)
+
+    await page.route(ORIGIN + "/**", serve)
+    try:
+        await page.goto(document, wait_until="domcontentloaded")
+        await page.wait_for_selector(ready, state="attached")
+    finally:
+        await page.unroute(ORIGIN + "/**", serve)
+
+
+def _screenshot_job(html, path=None):
+    async def render(page):
+        await open_sheet(page, html)
+        return await page.locator("#sheet").screenshot(path=path)
+
+    return render
+
+
+def sheet_png(html, path=None):
+    """
+    Screenshot of the #sheet element; also written to `path` if given.
+    """
+    return get_browser_pool().run(_screenshot_job(html, path))
+
+
+def sheet_pdf(html):
+    """
+    Vector PDF of a pdf_export.pdf_document(); the document sets its own
+    A4 pages.
+    """
+
+    async def render(page):
+        await open_sheet(page, html, "/character.html", PDF_READY)
+        return await page.pdf(print_background=True, prefer_css_page_size=True)
+
+    return get_browser_pool().run(render)
+
+
+def sheet_pngs(sheets, window=None):
+    """
+    Yields (name, png) for an iterable of (name, html), in order.
+    Sheets render on parallel pages with at most `window` in flight, so
+    neither `sheets` nor the screenshots are ever held in full.
+    """
+    pool = get_browser_pool()
+    window = window or pool.size * 2
+    pending = deque()
+    for name, html in sheets:
+        pending.append((name, pool.submit(_screenshot_job(html))))
+        if len(pending) >= window:
+            name, future = pending.popleft()
+            yield name, future.result(pool.timeout)
+    while pending:
+        name, future = pending.popleft()
+        yield name, future.result(pool.timeout)
+
+
+# region BATCH
+class _Chunks(io.RawIOBase):
+    """
+    Write-only sink; ZipFile sees it as unseekable and uses data descriptors.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(entries):
+    """
+    Yields a ZIP archive of (name, bytes) entries as they arrive.
+    PNG and WebP are already compressed, so entries are stored.
+    """
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+# Flask-free rendering for the command line; url_for only serves /static
+_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+_env.globals["url_for"] = lambda endpoint, filename: f"/static/{filename}"
+
+
+def render_sheet(compendium, seed):
+    test = MBCharacter(compendium, seed=seed)
+    test.generate()
+    ch = dict(test.character.__dict__.items())
+    return _env.get_template("character.html").render(character=ch, seed=seed)
+
+
+# endregion
+
+
+def encode_image(png, fmt):
+    """
+    Re-encodes a PNG screenshot as `fmt` (see IMAGE_FORMATS) in memory.
+    """
+    if fmt == "png":
+        return png
+
+    image = Image.open(BytesIO(png)).convert("RGB")
+    buffer = BytesIO()
+    if fmt == "png8":
+        image.quantize(colors=PALETTE_COLORS).save(buffer, "PNG", optimize=True)
+    elif fmt == "webp":
+        image.save(buffer, "WEBP", lossless=True, method=4)
+    else:
+        raise ValueError(f"Unknown image format: {fmt}")
+    return buffer.getvalue()
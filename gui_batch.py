@@ -0,0 +1,149 @@
+"""
+Character sheets through the desktop pipeline, without a display.
+
+    python -m gui_batch --count 40 --seed 7 --sqlite
+
+Every character goes through WebWindow, as after "Сгенерировать персонажа",
+under Qt's offscreen platform: one QApplication and one QtWebEngine profile
+for the whole run, so the engine starts once, not once per character.
+Pages are rendered into the export cache, then copied out to
+exports/batch-<seed>/<index>-<seed>/01.png..05.png (names as in the
+/export_batch archive), where cache eviction does not reach them.
+Progress goes to stderr, "seed<TAB>folder" lines to stdout.
+"""
+
+import os
+import sys
+import shutil
+import argparse
+from pathlib import Path
+from random import randrange
+
+from db import DB_PATH
+from compendium import Compendium
+from main_generate import MBCharacter, SEED_LIMIT, seed_arg, get_compendium
+from exports import batch_seeds
+from export_cache import EXPORT_DIR
+from GUI import WebWindow
+from PyQt6.QtWidgets import QApplication
+
+
+class GuiBatch:
+    def __init__(self, count, seed=None, parallel=2, compendium=None, out=None):
+        """
+        count      : Сколько персонажей выгрузить;
+        seed       : Сид пачки, тот же сид дает ту же пачку;
+        parallel   : Сколько персонажей рендерится одновременно;
+        compendium : Компендиум, по умолчанию из Postgres;
+        out        : Папка пачки, по умолчанию exports/batch-<seed>;
+        """
+        self.count = count
+        self.seed = randrange(SEED_LIMIT) if seed is None else seed
+        self.out = Path(out) if out else EXPORT_DIR / f"batch-{self.seed}"
+        self.parallel = max(1, parallel)
+        self.compendium = compendium or get_compendium()
+        self.folders = []
+        # Seeds whose export failed; nothing of them is cached
+        self.failed = []
+
+        self._seeds = enumerate(batch_seeds(count, self.seed), 1)
+        self._windows = set()
+
+    def start(self, on_done):
+        self._on_done = on_done
+        for _ in range(self.parallel):
+            self._next()
+        if not self._windows:
+            on_done()
+
+    def _next(self):
+        index, character_seed = next(self._seeds, (None, None))
+        if index is None:
+            return
+        character = MBCharacter(self.compendium, seed=character_seed)
+        character.generate()
+
+        window = WebWindow(dict(character.character.__dict__))
+        window.finished.connect(
+            lambda folder: self._on_finished(window, index, character_seed, folder)
+        )
+        self._windows.add(window)
+
+    def _on_finished(self, window, index, character_seed, folder):
+        self._windows.discard(window)
+        window.deleteLater()
+
+        if folder:
+            folder = self._copy_out(folder, f"{index:04d}-{character_seed}")
+        if folder:
+            self.folders.append(folder)
+            print(f"{character_seed}\t{folder}", flush=True)
+        else:
+            self.failed.append(character_seed)
+            print(f"\nFailed: seed {character_seed}", file=sys.stderr)
+        done = len(self.folders) + len(self.failed)
+        print(f"\r{done}/{self.count}", end="", file=sys.stderr, flush=True)
+
+        self._next()
+        if not self._windows:
+            print(file=sys.stderr)
+            self._on_done()
+
+    def _copy_out(self, entry, name):
+        # The cache entry can be evicted by the next commit, ours or the app's
+        target = self.out / name
+        try:
+            shutil.copytree(entry, target, dirs_exist_ok=True)
+        except OSError:
+            return ""
+        return str(target)
+
+
+def run(count, seed=None, parallel=2, compendium=None, out=None):
+    """
+    Exports `count` characters; returns the batch seed, the folders and
+    the seeds that failed.
+    """
+    # Read when the application is created: no window ever reaches a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Each WebWindow closes when done; the batch decides when to quit
+    app.setQuitOnLastWindowClosed(False)
+    batch = GuiBatch(count, seed, parallel, compendium, out)
+    batch.start(app.quit)
+    if len(batch.folders) + len(batch.failed) < count:
+        app.exec()
+    return batch.seed, batch.folders, batch.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless GUI export of sheets")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--seed", type=seed_arg, default=None)
+    parser.add_argument(
+        "--parallel", type=int, default=2, help="Characters rendered at once"
+    )
+    parser.add_argument(
+        "--out", type=Path, default=None, help="Folder, exports/batch-<seed> by default"
+    )
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=DB_PATH,
+        default=None,
+        help="Read the compendium from SQLite instead of Postgres",
+    )
+    args = parser.parse_args()
+
+    compendium = Compendium.from_sqlite(args.sqlite) if args.sqlite else None
+    seed, folders, failed = run(
+        args.count, args.seed, args.parallel, compendium, args.out
+    )
+    print(f"Done, seed {seed}: {len(folders)} characters", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} failed: {' '.join(map(str, failed))}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,43 @@
-import psycopg2
-from random import randint, choice
-from psycopg2.extras import DictCursor
-from dataclasses import dataclass
-import re
-import operator as op
+import numpy as np
+from random import Random, randrange
+from dataclasses import dataclass, fields
 import os
-from dotenv import load_dotenv
+import sys
+import csv
+import json
+import argparse
 from typing import List
 from models.types import Armor, Weapon, Items, Skills
+from db import DB_PATH
+from compendium import Compendium, SharedCompendium
+from dice import compile_formula
+from pg_pool import get_pool
 
-load_dotenv()
-OPERATORS = {"+": op.add, "-": op.sub, "//": op.floordiv, "*": op.mul}
+STATS = ("hp", "money", "signs", "agility", "presence", "strength", "toughness")
+SEXES = ("Мужчина", "Женщина")
+ITEM_CATEGORIES = ("first", "second", "third")
+# Every phase draws from its own stream, so adding a draw to one phase
+# does not shift the results of the others for the same seed
+PHASES = ("basic", "class", "stats", "links", "equipment", "narrative", "items")
+SEED_LIMIT = 2**63
 
-connection = psycopg2.connect(
-    dbname=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-)
-cursor = connection.cursor(cursor_factory=DictCursor)
+
+def _load_compendium():
+    with get_pool().connection() as connection:
+        return Compendium.from_postgres(connection)
+
+
+_compendium = SharedCompendium(_load_compendium)
+
+
+# Snapshot of the Postgres compendium, loaded on first use
+def get_compendium():
+    return _compendium.get()
+
+
+# Call after every commit that changes the compendium tables
+def reset_compendium():
+    _compendium.reset()
 
 
 @dataclass
@@ -52,156 +70,386 @@ class Character:
     items: List[Items]
 
 
+CHARACTER_FIELDS = tuple(f.name for f in fields(Character))
+NESTED_FIELDS = frozenset(("bonus", "skills", "armor", "weapon", "items"))
+
+
+def character_json(character, seed=None):
+    """
+    One NDJSON line, read straight from the dataclass fields; a sheet
+    seed, if given, comes first.
+    """
+    record = {} if seed is None else {"seed": seed}
+    record.update((name, getattr(character, name)) for name in CHARACTER_FIELDS)
+    return json.dumps(record, ensure_ascii=False)
+
+
+def character_csv_row(character, seed=None):
+    row = [
+        (
+            json.dumps(getattr(character, name), ensure_ascii=False)
+            if name in NESTED_FIELDS
+            else getattr(character, name)
+        )
+        for name in CHARACTER_FIELDS
+    ]
+    return row if seed is None else [seed, *row]
+
+
+def build_character(cmp, picks):
+    """
+    Собирает Character из уже сделанных бросков:
+    class_id, age, sex и STATS    : числа;
+    bonus_id, memorie_id          : id строк из compendium;
+    armor_id, weapon_id           : id строк, 0 - нет брони/оружия;
+    narrative, items              : {категория: индекс строки в категории};
+    """
+    ch_cls = cmp.classes[picks["class_id"]]
+    class_id = ch_cls["id"]
+    data = {stat: picks[stat] for stat in STATS}
+
+    # Basic
+    data["age"] = picks["age"]
+    data["sex"] = SEXES[picks["sex"]]
+
+    # Class
+    data["id"] = ch_cls["slug"]
+    data["character_class"] = ch_cls["name_ru"]
+    data["description"] = ch_cls["desc_ru"]
+
+    # Bonus
+    data["bonus"] = {"type": ch_cls["bonus_type"]}
+    ch_bonus = cmp.bonuses[picks["bonus_id"]]
+    data["bonus"]["text"] = f"{ch_bonus['name_ru']} : {ch_bonus['desc_ru']}"
+
+    # Skills
+    ch_skills = [cmp.skills[i] for i in cmp.class_skills.get(class_id, [])]
+    data["skills"] = {e["name_ru"]: e["desc_ru"] for e in ch_skills}
+
+    # Narrative
+    for category, index in picks["narrative"].items():
+        data[category] = cmp.narrative[category][index]["text_ru"]
+
+    # Memories
+    ch_memorie = cmp.memories[picks["memorie_id"]]
+    data["memorie"] = f"{ch_cls['memorie_type']} {ch_memorie['desc_ru']}"
+
+    # Armor
+    if not picks["armor_id"]:
+        data["armor"] = {"name": "Нет брони", "level": 0, "effect": None}
+    else:
+        ch_armor = cmp.armors[picks["armor_id"]]
+        data["armor"] = {
+            "name": ch_armor["name_ru"],
+            "level": ch_armor["armor_level"],
+            "effect": ch_armor["effect"],
+        }
+
+    # Weapon
+    if not picks["weapon_id"]:
+        data["weapon"] = {
+            "name": "Невооруженный",
+            "damage": "d1",
+            "effect": None,
+            "ammo": None,
+        }
+    else:
+        ch_weapon = cmp.weapons[picks["weapon_id"]]
+        data["weapon"] = {
+            "name": ch_weapon["name_ru"],
+            "damage": ch_weapon["damage"],
+            "effect": ch_weapon["effect"],
+            "ammo": (
+                data["presence"] + int(ch_weapon["ammo"].split()[-1])
+                if ch_weapon["ammo"]
+                else None
+            ),
+        }
+
+    # Items
+    data["items"] = {}
+    for category, index in picks["items"].items():
+        ch_items = cmp.items[category][index]
+        data["items"][ch_items["name_ru"]] = {
+            "effect": ch_items["effect"],
+            "counts": ch_items["counts"],
+            "cost": ch_items["cost"],
+        }
+
+    return Character(**data)
+
+
+@dataclass
+class CharacterBatch:
+    """
+    Structure-of-arrays result of MBCharacter.generate_many.
+    Every column holds one value per character; Character objects
+    are only built when indexed or iterated.
+    """
+
+    compendium: Compendium
+    columns: dict
+    narrative: dict
+    items: dict
+
+    def __len__(self):
+        return len(self.columns["class_id"])
+
+    def __getitem__(self, index):
+        picks = {name: int(column[index]) for name, column in self.columns.items()}
+        picks["narrative"] = {c: int(v[index]) for c, v in self.narrative.items()}
+        picks["items"] = {c: int(v[index]) for c, v in self.items.items()}
+        return build_character(self.compendium, picks)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def check_seed(seed):
+    """
+    `seed` if it is a valid character seed, else ValueError.
+    Random() drops the sign of an int seed, so negative ones are refused.
+    """
+    if not 0 <= seed < SEED_LIMIT:
+        raise ValueError(f"seed must be in [0, {SEED_LIMIT})")
+    return seed
+
+
+def parse_seed(text):
+    # For request.args.get(type=...), which falls back to the default on ValueError
+    return check_seed(int(text))
+
+
+def seed_arg(text):
+    # argparse type for --seed
+    try:
+        return parse_seed(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def batch_seeds(count, seed):
+    """
+    Character seeds of a batch; the same batch seed gives the same batch.
+    """
+    rng = Random(seed)
+    return (rng.randrange(SEED_LIMIT) for _ in range(count))
+
+
+def phase_streams(seed):
+    return {phase: Random(seed << 4 | index) for index, phase in enumerate(PHASES)}
+
+
 class MBCharacter:
-    def __init__(self):
+    def __init__(self, compendium=None, seed=None):
+        self.compendium = compendium if compendium is not None else get_compendium()
+        # Fixed seed: every generate() returns the same character.
+        # Without it each generate() picks a fresh seed, stored in character_seed
+        self.seed = check_seed(seed) if seed is not None else None
+        self.character_seed = None
         self.character = None
 
     @staticmethod
     def roll_dice(string):
-        pattern = r"(?:(\d*)d)?(\d+)([+\-*])?(\d+)?"
-        match = re.fullmatch(pattern, string)
-        if match:
-            count, value, operator, bonus = match.groups()
-            count = int(count) if count else 1
-            value = int(value)
-            operator = OPERATORS.get(operator, op.add)
-            bonus = int(bonus) if bonus else 0
-            roll = sum([randint(1, value) for _ in range(count)])
-            return operator(roll, bonus)
+        return compile_formula(string).roll()
 
     def generate(self):
-        data = {}
+        cmp = self.compendium
+        seed = self.seed if self.seed is not None else randrange(SEED_LIMIT)
+        rng = phase_streams(seed)
 
         # Basic
-        data["age"] = randint(18, 60)
-        data["sex"] = choice(["Мужчина", "Женщина"])
+        picks = {"age": rng["basic"].randint(18, 60), "sex": rng["basic"].randint(0, 1)}
 
-        # Choose the class
-        cursor.execute("SELECT * FROM classes ORDER BY random() LIMIT 1;")
-        ch_cls = cursor.fetchone()
+        # Class and stats
+        ch_cls = cmp.classes[rng["class"].choice(cmp.class_ids)]
         class_id = ch_cls["id"]
+        picks["class_id"] = class_id
+        for stat in STATS:
+            plan = compile_formula(ch_cls[f"{stat}_formula"])
+            picks[stat] = plan.roll(rng["stats"])
 
-        data["id"] = ch_cls["slug"]
-        data["character_class"] = ch_cls["name_ru"]
-        data["description"] = ch_cls["desc_ru"]
-        data["hp"] = self.roll_dice(ch_cls["hp_formula"])
-        data["money"] = self.roll_dice(ch_cls["money_formula"])
-        data["signs"] = self.roll_dice(ch_cls["signs_formula"])
-
-        # Abilities
-        data["agility"] = self.roll_dice(ch_cls["agility_formula"])
-        data["presence"] = self.roll_dice(ch_cls["presence_formula"])
-        data["strength"] = self.roll_dice(ch_cls["strength_formula"])
-        data["toughness"] = self.roll_dice(ch_cls["toughness_formula"])
-
-        # Bonus
-        data["bonus"] = {"type": ch_cls["bonus_type"]}
-
-        cursor.execute(
-            "SELECT bonuses_id FROM class_bonuses WHERE class_id = %s ORDER BY random() LIMIT 1;",
-            (class_id,),
-        )
-        ch_bonus = cursor.fetchone()[0]
+        # Bonus and memories
+        picks["bonus_id"] = rng["links"].choice(cmp.class_bonuses[class_id])
+        picks["memorie_id"] = rng["links"].choice(cmp.class_memories[class_id])
 
-        cursor.execute("SELECT * FROM bonuses WHERE id = %s;", (ch_bonus,))
-        ch_bonus = cursor.fetchone()
-        data["bonus"]["text"] = f"{ch_bonus['name_ru']} : {ch_bonus['desc_ru']}"
+        # Armor and weapon: the formula limits how far down the
+        # id-ordered table the pick may go, whatever gaps the ids have
+        for kind, ids in (("armor", cmp.armor_ids), ("weapon", cmp.weapon_ids)):
+            formula = ch_cls[f"{kind}_formula"]
+            if formula is None or not ids:
+                picks[f"{kind}_id"] = 0
+                continue
+            limit = compile_formula(formula).roll(rng["equipment"])
+            limit = min(max(limit, 1), len(ids))
+            picks[f"{kind}_id"] = ids[rng["equipment"].randrange(limit)]
 
-        # Skills
-        cursor.execute(
-            "SELECT skills_id FROM class_skills WHERE class_id = %s;", (class_id,)
-        )
-        ch_skills = tuple(element[0] for element in cursor.fetchall())
+        # Narrative and items
+        picks["narrative"] = {
+            category: rng["narrative"].randrange(len(cmp.narrative[category]))
+            for category in sorted(cmp.narrative)
+        }
+        picks["items"] = {
+            category: rng["items"].randrange(len(cmp.items[category]))
+            for category in ITEM_CATEGORIES
+        }
 
-        cursor.execute(
-            "SELECT name_ru, desc_ru FROM skills WHERE id IN %s;", (ch_skills,)
-        )
-        ch_skills = cursor.fetchall()
-        ch_skills = {e["name_ru"]: e["desc_ru"] for e in ch_skills}
-        data["skills"] = ch_skills
-
-        # Narrative
-        cursor.execute(
-            """SELECT n.*
-            FROM (SELECT DISTINCT category FROM narrative) c
-            CROSS JOIN LATERAL (
-            SELECT *
-            FROM narrative n
-            WHERE n.category = c.category
-            ORDER BY random()
-            LIMIT 1
-            ) n
-            ORDER BY c.category;
-            """
-        )
-        ch_narrative = {e[2]: e[3] for e in cursor.fetchall()}
-        for key, value in ch_narrative.items():
-            data[key] = value
-
-        # Memories
-        cursor.execute(
-            "SELECT memories_id FROM class_memories WHERE class_id = %s ORDER BY random() LIMIT 1;",
-            (class_id,),
+        self.character_seed = seed
+        self.character = build_character(cmp, picks)
+
+    def generate_many(self, n, rng=None):
+        """
+        Rolls n characters at once with NumPy and returns a CharacterBatch.
+        """
+        cmp = self.compendium
+        rng = rng if rng is not None else np.random.default_rng(self.seed)
+
+        class_ids = cmp.arrays["class_ids"]
+        class_col = class_ids[rng.integers(0, len(class_ids), n)]
+        columns = {
+            "class_id": class_col,
+            "age": rng.integers(18, 61, n),
+            "sex": rng.integers(0, 2, n),
+        }
+        for name in STATS + ("bonus_id", "memorie_id", "armor_id", "weapon_id"):
+            columns[name] = np.zeros(n, dtype=np.int64)
+
+        # Everything that depends on the class is rolled per class group
+        for class_id in np.unique(class_col):
+            rows = np.flatnonzero(class_col == class_id)
+            size = rows.size
+            ch_cls = cmp.classes[int(class_id)]
+
+            for stat in STATS:
+                plan = compile_formula(ch_cls[f"{stat}_formula"])
+                columns[stat][rows] = plan.roll_many(size, rng)
+
+            for name, table in (
+                ("bonus_id", "class_bonuses"),
+                ("memorie_id", "class_memories"),
+            ):
+                links = cmp.arrays[table][class_id]
+                columns[name][rows] = links[rng.integers(0, len(links), size)]
+
+            for kind in ("armor", "weapon"):
+                ids = cmp.arrays[f"{kind}_ids"]
+                formula = ch_cls[f"{kind}_formula"]
+                if formula is not None and len(ids):
+                    limit = compile_formula(formula).roll_many(size, rng)
+                    limit = np.clip(limit, 1, len(ids))
+                    columns[f"{kind}_id"][rows] = ids[rng.integers(0, limit)]
+
+        narrative = {
+            category: rng.integers(0, len(cmp.narrative[category]), n)
+            for category in sorted(cmp.narrative)
+        }
+        items = {
+            category: rng.integers(0, len(cmp.items[category]), n)
+            for category in ITEM_CATEGORIES
+        }
+        return CharacterBatch(cmp, columns, narrative, items)
+
+
+# region CLI
+CHUNK_SIZE = 10_000
+
+
+def stream_characters(generator, count, rng):
+    """
+    Yields count characters, rolling at most CHUNK_SIZE of them at a time.
+    """
+    while count > 0:
+        batch = generator.generate_many(min(count, CHUNK_SIZE), rng)
+        yield from batch
+        count -= len(batch)
+
+
+def sheet_characters(compendium, count, seed):
+    """
+    Yields (seed, character) for the batch `seed`: each one is the sheet
+    /character/<seed> shows. Far slower than stream_characters.
+    """
+    for character_seed in batch_seeds(count, seed):
+        generator = MBCharacter(compendium, seed=character_seed)
+        generator.generate()
+        yield character_seed, generator.character
+
+
+def write_characters(characters, out, fmt, with_seeds=False):
+    """
+    `characters` holds (seed, character) pairs if `with_seeds`.
+    """
+    pairs = characters if with_seeds else ((None, c) for c in characters)
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow((("seed",) if with_seeds else ()) + CHARACTER_FIELDS)
+        for seed, character in pairs:
+            writer.writerow(character_csv_row(character, seed))
+    else:
+        for seed, character in pairs:
+            out.write(character_json(character, seed))
+            out.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m main_generate", description="Stream generated characters"
+    )
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--output", "-o", help="File to write, stdout by default")
+    parser.add_argument(
+        "--seed",
+        type=seed_arg,
+        default=None,
+        help="Seed of the whole run. Without --sheets it seeds one NumPy "
+        "stream and is not a /character/<seed> seed",
+    )
+    parser.add_argument(
+        "--sheets",
+        action="store_true",
+        help="Draw every character from its own sheet seed, written as the "
+        "'seed' field (the same seeds as /export_batch); much slower",
+    )
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=DB_PATH,
+        default=None,
+        help="Read the compendium from SQLite instead of Postgres",
+    )
+    args = parser.parse_args(argv)
+
+    compendium = Compendium.from_sqlite(args.sqlite) if args.sqlite else None
+    if args.sheets:
+        seed = randrange(SEED_LIMIT) if args.seed is None else args.seed
+        characters = sheet_characters(
+            compendium if compendium is not None else get_compendium(),
+            args.count,
+            seed,
         )
-        ch_memorie = cursor.fetchone()[0]
-        cursor.execute(
-            "SELECT * FROM memories WHERE id = %s;",
-            (ch_memorie,),
+    else:
+        generator = MBCharacter(compendium)
+        characters = stream_characters(
+            generator, args.count, np.random.default_rng(args.seed)
         )
-        ch_memorie = cursor.fetchone()
-        data["memorie"] = f"{ch_cls['memorie_type']} {ch_memorie['desc_ru']}"
-        # Armor
-        if ch_cls["armor_formula"] is None:
-            data["armor"] = {"name": "Нет брони", "level": 0, "effect": None}
-        else:
-            cursor.execute(
-                "SELECT * FROM armors WHERE id = %s;",
-                (randint(1, self.roll_dice(ch_cls["armor_formula"])),),
-            )
-            ch_armor = cursor.fetchone()
-            data["armor"] = {
-                "name": ch_armor["name_ru"],
-                "level": ch_armor["armor_level"],
-                "effect": ch_armor["effect"],
-            }
-
-        # Weapon
-        if ch_cls["weapon_formula"] is None:
-            data["weapon"] = {
-                "name": "Невооруженный",
-                "damage": "d1",
-                "effect": None,
-                "ammo": None,
-            }
-        else:
-            cursor.execute(
-                "SELECT * FROM weapons WHERE id = %s;",
-                (randint(1, self.roll_dice(ch_cls["weapon_formula"])),),
-            )
-            ch_weapon = cursor.fetchone()
-            data["weapon"] = {
-                "name": ch_weapon["name_ru"],
-                "damage": ch_weapon["damage"],
-                "effect": ch_weapon["effect"],
-                "ammo": (
-                    data["presence"] + int(ch_weapon["ammo"].split()[2])
-                    if ch_weapon["ammo"]
-                    else None
-                ),
-            }
-
-        # Items
-        data["items"] = {}
-        for element in ("first", "second", "third"):
-            cursor.execute(
-                "SELECT * FROM items WHERE category = %s ORDER BY random() LIMIT 1;",
-                (element,),
-            )
-            ch_items = cursor.fetchone()
-            data["items"][ch_items["name_ru"]] = {
-                "effect": ch_items["effect"],
-                "counts": ch_items["counts"],
-                "cost": ch_items["cost"],
-            }
-
-        self.character = Character(**data)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            write_characters(characters, out, args.format, args.sheets)
+        return
+
+    try:
+        write_characters(characters, sys.stdout, args.format, args.sheets)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    main()
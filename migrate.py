@@ -0,0 +1,58 @@
+"""
+Schema additions the apps rely on, applied at deploy time, not by requests:
+
+    python -m migrate [--app-role ROLE]  # Postgres, DB_* from .env
+    python -m migrate --sqlite [path]    # morkborg.sqlite by default
+
+Every step can be run again; finished steps are left alone. The Postgres
+steps need a role with DDL rights; the apps only read and write rows, and
+--app-role grants the role they connect as what it needs to read.
+"""
+
+import sys
+import argparse
+
+import search
+import revisions
+from db import DB_PATH
+from pg_pool import get_pool
+
+
+def migrate_pg(app_role=None):
+    with get_pool().connection() as connection:
+        search.migrate_pg(connection)
+        print("postgres: search indexes ready", file=sys.stderr)
+        revisions.migrate_pg(connection, app_role)
+        print("postgres: table revisions ready", file=sys.stderr)
+
+
+def migrate_sqlite(path):
+    built = search.migrate_sqlite(path)
+    state = "built" if built else "already there"
+    print(f"sqlite: search index {state}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema additions")
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=DB_PATH,
+        default=None,
+        help="Migrate a SQLite compendium instead of Postgres",
+    )
+    parser.add_argument(
+        "--app-role",
+        default=None,
+        help="Postgres role the apps connect as, granted SELECT on table_revisions",
+    )
+    args = parser.parse_args()
+
+    if args.sqlite:
+        migrate_sqlite(args.sqlite)
+    else:
+        migrate_pg(args.app_role)
+
+
+if __name__ == "__main__":
+    main()
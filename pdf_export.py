@@ -0,0 +1,42 @@
+"""
+One multi-page PDF of the five local sheet templates.
+
+The pages are rendered with Jinja and put into a single document, one
+page each, so a single print pass of one render context produces the whole
+vector PDF. The GUI prints it with QtWebEngine, Flask with the Playwright
+pool (exports.sheet_pdf). Like the pages themselves, the document is based
+at the repo root: assets are linked as static/....
+"""
+
+import re
+from pathlib import Path
+from markupsafe import Markup
+from jinja2 import Environment, FileSystemLoader
+
+REPO_ROOT = Path(__file__).resolve().parent
+TEMPLATES_DIR = REPO_ROOT / "templates"
+PDF_PAGES = [
+    "character_local_one.html",
+    "character_local_two.html",
+    "character_local_three.html",
+    "character_local_four.html",
+    "character_local_five.html",
+]
+PDF_TEMPLATE = "character_local_pdf.html"
+# Sheets are laid out for a 1200px window, A4 has about 730px
+PDF_ZOOM = 0.6
+READY_SELECTOR = "html[data-ready]"
+
+_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+_body = re.compile(r"<body[^>]*>(.*)</body>", re.S)
+
+
+def pdf_document(character):
+    """
+    HTML of the whole PDF: every page of PDF_PAGES for `character`.
+    """
+    pages = []
+    for name in PDF_PAGES:
+        html = _env.get_template(name).render(character=character)
+        pages.append(Markup(_body.search(html).group(1)))
+    return _env.get_template(PDF_TEMPLATE).render(pages=pages, zoom=PDF_ZOOM)
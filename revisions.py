@@ -0,0 +1,101 @@
+"""
+Per-table revision numbers in Postgres, for conditional GETs.
+
+A statement-level trigger on each compendium table bumps its row in
+table_revisions on every INSERT, UPDATE, DELETE or TRUNCATE, whichever
+route made it. Pages built from a table use (revision, modified) as their
+ETag and Last-Modified; one primary-key lookup tells whether a client's
+copy is still current.
+
+The table, function and triggers come from `python -m migrate`. The
+function runs as its owner (SECURITY DEFINER), so roles that may write the
+compendium need no rights on table_revisions; the apps' role needs SELECT
+on it (`python -m migrate --app-role <role>`).
+"""
+
+from psycopg2 import errors, sql
+
+REVISION_TABLES = (
+    "classes",
+    "skills",
+    "bonuses",
+    "memories",
+    "items",
+    "weapons",
+    "armors",
+    "narrative",
+)
+
+
+def migrate_pg(connection, app_role=None):
+    """
+    Creates table_revisions, bump_table_revision() and the missing
+    triggers in one transaction, and grants SELECT on table_revisions to
+    `app_role` if given. Tables that already have their trigger are not
+    touched, so a re-run takes no locks on them.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_revisions (
+                name TEXT PRIMARY KEY,
+                revision BIGINT NOT NULL DEFAULT 0,
+                modified TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """)
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION bump_table_revision() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO table_revisions (name, revision, modified)
+                VALUES (TG_TABLE_NAME, 1, now())
+                ON CONFLICT (name) DO UPDATE
+                SET revision = table_revisions.revision + 1, modified = now();
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, pg_temp
+            """)
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_trigger t
+            JOIN pg_class c ON c.oid = t.tgrelid
+            WHERE t.tgname = c.relname || '_revision' AND c.relname = ANY(%s)
+            """,
+            (list(REVISION_TABLES),),
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+        for table in REVISION_TABLES:
+            if table not in existing:
+                cursor.execute(
+                    f"CREATE TRIGGER {table}_revision "
+                    f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION bump_table_revision()"
+                )
+            cursor.execute(
+                "INSERT INTO table_revisions (name) VALUES (%s) "
+                "ON CONFLICT (name) DO NOTHING",
+                (table,),
+            )
+        if app_role:
+            cursor.execute(
+                sql.SQL("GRANT SELECT ON table_revisions TO {}").format(
+                    sql.Identifier(app_role)
+                )
+            )
+    connection.commit()
+
+
+def table_revision(connection, table):
+    """
+    (revision, modified) of `table`, or None if the migration has not run
+    or the role may not read table_revisions.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT revision, modified FROM table_revisions WHERE name = %s",
+                (table,),
+            )
+            return cursor.fetchone()
+    except (errors.UndefinedTable, errors.InsufficientPrivilege):
+        # Pages are then served without validators
+        connection.rollback()
+        return None
@@ -0,0 +1,278 @@
+"""
+Full-text search over the whole compendium.
+
+SQLite keeps one FTS5 table, search_index, over the eight content tables;
+triggers on each table keep it in sync row by row. Postgres gets a GIN
+index on a Russian tsvector expression per table, which the server keeps
+up to date by itself. Both are built by `python -m migrate`, never on a
+request: the search functions only read.
+
+Russian words are matched by stem: the ending is cut (`_stem`) and the rest
+searched as a prefix in SQLite; Postgres uses its own 'russian' config.
+Titles weigh more than descriptions in the ranking.
+"""
+
+import re
+import sqlite3
+
+import db
+from db import get_connection
+
+# table -> (title column, text columns); the order fixes index rowids
+SEARCH_TABLES = {
+    "classes": ("name_ru", ["desc_ru"]),
+    "skills": ("name_ru", ["desc_ru"]),
+    "bonuses": ("name_ru", ["desc_ru"]),
+    "memories": ("name_ru", ["desc_ru"]),
+    "items": ("name_ru", ["effect"]),
+    "weapons": ("name_ru", ["effect"]),
+    "armors": ("name_ru", ["effect"]),
+    "narrative": ("category", ["text_ru"]),
+}
+SEARCH_LIMIT = 50
+# search_index rowid = source id * ROWID_STRIDE + table number
+ROWID_STRIDE = 16
+
+_word = re.compile(r"\w+")
+# Longest first; a stem keeps at least 3 letters
+_endings = sorted(
+    "ами ями ого его ому ему ыми ими ией иям иях ой ей ий ый ая яя ое ее ые ие "
+    "ых их ым им ом ем ах ях ов ев ам ям ую юю ия ию а я о е ы и у ю ь".split(),
+    key=len,
+    reverse=True,
+)
+
+
+def _stem(word):
+    for ending in _endings:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[: -len(ending)]
+    return word
+
+
+def _words(query):
+    return _word.findall(query.lower().replace("ё", "е"))
+
+
+# region SQLITE
+def fts_query(query):
+    """
+    FTS5 query for `query`: every word must match, by stem prefix.
+    """
+    return " ".join(f'"{_stem(word)}"*' for word in _words(query))
+
+
+def _folded(expr):
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _sqlite_row(table, ref):
+    title, texts = SEARCH_TABLES[table]
+    number = list(SEARCH_TABLES).index(table)
+    body = " || ' ' || ".join(_folded(f"{ref}.{column}") for column in texts)
+    return f"{ref}.id * {ROWID_STRIDE} + {number}", _folded(f"{ref}.{title}"), body
+
+
+def _sqlite_triggers():
+    return [
+        f"{table}_search_{kind}"
+        for table in SEARCH_TABLES
+        for kind in "ai ad au".split()
+    ]
+
+
+def migrate_sqlite(path=None):
+    """
+    Builds search_index and its triggers in `path` (morkborg.sqlite by
+    default) in one transaction. A complete index is left alone; a partial
+    one, e.g. from an interrupted older build, is dropped and rebuilt.
+    Returns True if it built the index.
+    """
+    # Autocommit mode: DDL only joins the transaction opened by BEGIN
+    con = sqlite3.connect(path or db.DB_PATH, isolation_level=None)
+    try:
+        names = {row[0] for row in con.execute("SELECT name FROM sqlite_master")}
+        if "search_index" in names and names.issuperset(_sqlite_triggers()):
+            return False
+
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for trigger in _sqlite_triggers():
+                con.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            con.execute("DROP TABLE IF EXISTS search_index")
+            _create_sqlite_index(con)
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        return True
+    finally:
+        con.close()
+
+
+def _create_sqlite_index(con):
+    con.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            title, body, tbl UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """)
+    for table in SEARCH_TABLES:
+        rowid, title, body = _sqlite_row(table, "new")
+        old_rowid, _, _ = _sqlite_row(table, "old")
+        insert = (
+            f"INSERT INTO search_index (rowid, title, body, tbl) "
+            f"VALUES ({rowid}, {title}, {body}, '{table}');"
+        )
+        delete = f"DELETE FROM search_index WHERE rowid = {old_rowid};"
+        con.execute(
+            f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} "
+            f"BEGIN {insert} END"
+        )
+        con.execute(
+            f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} "
+            f"BEGIN {delete} END"
+        )
+        con.execute(
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} "
+            f"BEGIN {delete} {insert} END"
+        )
+        rowid, title, body = _sqlite_row(table, table)
+        con.execute(
+            f"INSERT INTO search_index (rowid, title, body, tbl) "
+            f"SELECT {rowid}, {title}, {body}, '{table}' FROM {table}"
+        )
+
+
+def search_sqlite(query, limit=SEARCH_LIMIT):
+    """
+    Best matches of `query` in morkborg.sqlite, best first.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+
+    with get_connection(readonly=True) as con:
+        try:
+            # Every match is ranked: an old row can be the best one
+            rows = con.execute(
+                """
+                SELECT rowid, tbl, title,
+                       snippet(search_index, 1, '', '', '…', 16) AS snippet
+                FROM search_index
+                WHERE search_index MATCH ?
+                ORDER BY bm25(search_index, 5.0, 1.0)
+                LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            if "search_index" in str(e):
+                raise RuntimeError(
+                    "No search index: run python -m migrate --sqlite"
+                ) from e
+            raise
+    return [
+        {
+            "section": row["tbl"],
+            "id": row["rowid"] // ROWID_STRIDE,
+            "title": row["title"],
+            "snippet": row["snippet"],
+        }
+        for row in rows
+    ]
+
+
+# endregion
+
+
+# region POSTGRES
+def _pg_vector(table):
+    # Must match the index expression exactly for the planner to use it
+    title, texts = SEARCH_TABLES[table]
+    body = " || ' ' || ".join(f"coalesce({column}, '')" for column in texts)
+    return (
+        f"(setweight(to_tsvector('russian', coalesce({title}, '')), 'A') || "
+        f"setweight(to_tsvector('russian', {body}), 'B'))"
+    )
+
+
+def _pg_index(table):
+    return f"{table}_search_idx"
+
+
+def migrate_pg(connection):
+    """
+    Builds the GIN index of every table with CREATE INDEX CONCURRENTLY,
+    so writes go on during the build. Runs in autocommit mode: a concurrent
+    build cannot be inside a transaction. An invalid index left by an
+    interrupted build is dropped and built again.
+    """
+    autocommit = connection.autocommit
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+                """,
+                ([_pg_index(table) for table in SEARCH_TABLES],),
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            for table in SEARCH_TABLES:
+                cursor.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_pg_index(table)} "
+                    f"ON {table} USING GIN ({_pg_vector(table)})"
+                )
+    finally:
+        connection.autocommit = autocommit
+
+
+def search_pg(connection, query, limit=SEARCH_LIMIT):
+    """
+    Best matches of `query` in Postgres, best first.
+    """
+    if not _words(query):
+        return []
+
+    parts = []
+    for table, (title, texts) in SEARCH_TABLES.items():
+        vector = _pg_vector(table)
+        # The index finds the matches; every one of them is ranked
+        parts.append(f"""
+            (SELECT '{table}' AS section, id, {title} AS title,
+                    left({texts[0]}, 160), ts_rank({vector}, query) AS rank
+             FROM {table}, websearch_to_tsquery('russian', %(q)s) AS query
+             WHERE {vector} @@ query
+             ORDER BY rank DESC
+             LIMIT %(limit)s)
+            """)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            " UNION ALL ".join(parts) + " ORDER BY rank DESC LIMIT %(limit)s",
+            {"q": query, "limit": limit},
+        )
+        rows = cursor.fetchall()
+    return [
+        {"section": section, "id": row_id, "title": title, "snippet": snippet}
+        for section, row_id, title, snippet, _ in rows
+    ]
+
+
+# endregion
+
+
+def search_row(table, row_id):
+    """
+    Searchable fields of one SQLite search hit, for a details view.
+    """
+    title, texts = SEARCH_TABLES[table]
+    with get_connection(readonly=True) as con:
+        row = con.execute(
+            f"SELECT {title}, {', '.join(texts)} FROM {table} WHERE id = ?",
+            (row_id,),
+        ).fetchone()
+    return dict(row) if row else {}
@@ -0,0 +1,28 @@
+import threading
+
+from compendium import SharedCompendium
+
+
+def test_build_overlapping_a_reset_is_not_kept():
+    started, resume = threading.Event(), threading.Event()
+    builds = []
+
+    def load():
+        builds.append(len(builds) + 1)
+        if len(builds) == 1:
+            started.set()
+            resume.wait()
+        return f"snapshot {len(builds)}"
+
+    shared = SharedCompendium(load)
+    first = []
+    thread = threading.Thread(target=lambda: first.append(shared.get()))
+    thread.start()
+    started.wait()
+    shared.reset()
+    resume.set()
+    thread.join()
+
+    assert first == ["snapshot 1"]
+    assert shared.get() == "snapshot 2"
+    assert shared.get() == "snapshot 2"
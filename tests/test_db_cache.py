@@ -0,0 +1,78 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import db
+import db_cache
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    path = tmp_path / "morkborg.sqlite"
+    shutil.copy(REPO_ROOT / "morkborg.sqlite", path)
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    # The probe connection and its data_version belong to the file it opened
+    monkeypatch.setattr(db_cache, "_probe", None)
+    monkeypatch.setattr(db_cache, "_data_version", None)
+    db_cache.clear()
+    yield path
+    if db_cache._probe is not None:
+        db_cache._probe.close()
+    db_cache.clear()
+    db.close_connections()
+
+
+@pytest.fixture
+def lookups(sqlite_path):
+    calls = {"skills": 0, "items": 0}
+
+    @db_cache.cached("skills")
+    def count_skills():
+        calls["skills"] += 1
+        with db.get_connection(readonly=True) as con:
+            return con.execute("SELECT COUNT(*) FROM skills").fetchone()[0]
+
+    @db_cache.cached("items")
+    def count_items():
+        calls["items"] += 1
+        with db.get_connection(readonly=True) as con:
+            return con.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    return count_skills, count_items, calls
+
+
+def test_bump_drops_only_the_lookups_of_its_tables(lookups):
+    count_skills, count_items, calls = lookups
+    skills, items = count_skills(), count_items()
+    assert (count_skills(), count_items()) == (skills, items)
+    assert calls == {"skills": 1, "items": 1}
+
+    # A write in this process, as the add_* forms make it
+    with db.get_connection() as con:
+        con.execute(
+            "INSERT INTO skills (slug, name_ru, desc_ru) VALUES ('x', 'x', 'x')"
+        )
+    db_cache.bump("skills")
+
+    assert (count_skills(), count_items()) == (skills + 1, items)
+    assert calls == {"skills": 2, "items": 1}
+
+
+def test_commit_from_another_connection_flushes_everything(lookups, sqlite_path):
+    count_skills, count_items, calls = lookups
+    skills, items = count_skills(), count_items()
+
+    # Another process writes without calling bump()
+    con = sqlite3.connect(sqlite_path)
+    with con:
+        con.execute(
+            "INSERT INTO skills (slug, name_ru, desc_ru) VALUES ('x', 'x', 'x')"
+        )
+    con.close()
+
+    assert (count_skills(), count_items()) == (skills + 1, items)
+    assert calls == {"skills": 2, "items": 2}
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from dice import MAX_DICE, MAX_SIDES, compile_formula, distribution, summarize
+
+
+@pytest.mark.parametrize(
+    "formula, parsed",
+    [
+        ("d6", (1, 6, "+", 0)),
+        ("3d6-1", (3, 6, "-", 1)),
+        ("2d6*10", (2, 6, "*", 10)),
+        ("4", (1, 4, "+", 0)),
+        (f"{MAX_DICE}d{MAX_SIDES}+2", (MAX_DICE, MAX_SIDES, "+", 2)),
+    ],
+)
+def test_compiles_within_limits(formula, parsed):
+    plan = compile_formula(formula)
+    assert (plan.count, plan.sides, plan.operator, plan.bonus) == parsed
+
+
+@pytest.mark.parametrize(
+    "formula",
+    ["0d6", f"{MAX_DICE + 1}d6", f"d{MAX_SIDES + 1}", "100000d100000", "d0", "3x6"],
+)
+def test_rejects_formulas_outside_limits(formula):
+    with pytest.raises(ValueError):
+        compile_formula(formula)
+    with pytest.raises(ValueError):
+        summarize(formula)
+
+
+def test_largest_distribution_is_exact():
+    dist = distribution(f"{MAX_DICE}d{MAX_SIDES}")
+    assert len(dist.values) == MAX_DICE * (MAX_SIDES - 1) + 1
+    assert dist.probs.sum() == pytest.approx(1)
+
+
+def test_roll_many_stays_in_range():
+    rolls = compile_formula("3d6+2").roll_many(1000, np.random.default_rng(1))
+    assert rolls.min() >= 5 and rolls.max() <= 20
@@ -0,0 +1,122 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import db
+import search
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORD = "зюзябра"
+# More weak matches than the old ranking window held
+WEAK = 400
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    path = tmp_path / "morkborg.sqlite"
+    shutil.copy(REPO_ROOT / "morkborg.sqlite", path)
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    search.migrate_sqlite(str(path))
+    yield path
+    db.close_connections()
+
+
+def _insert_skills(path, rows):
+    con = sqlite3.connect(path)
+    with con:
+        ids = [
+            con.execute(
+                "INSERT INTO skills (slug, name_ru, desc_ru) VALUES (?, ?, ?) "
+                "RETURNING id",
+                row,
+            ).fetchone()[0]
+            for row in rows
+        ]
+    con.close()
+    return ids
+
+
+def test_migration_is_atomic_and_repairs_a_partial_index(sqlite_path):
+    assert not search.migrate_sqlite(str(sqlite_path))
+
+    con = sqlite3.connect(sqlite_path)
+    con.execute("DROP TRIGGER skills_search_ai")
+    con.commit()
+    con.close()
+    assert search.migrate_sqlite(str(sqlite_path))
+
+    # The rebuilt triggers keep the index in sync again
+    (skill_id,) = _insert_skills(sqlite_path, [("zz", "Свежий навык", WORD)])
+    hits = search.search_sqlite(WORD)
+    assert [(hit["section"], hit["id"]) for hit in hits] == [("skills", skill_id)]
+
+
+def test_best_hit_outside_the_newest_matches(sqlite_path):
+    # The best body match is the oldest one: newer, weaker matches follow it
+    (best,) = _insert_skills(
+        sqlite_path, [("zz_best", "Лучший навык", f"{WORD} {WORD} {WORD}.")]
+    )
+    filler = " ".join(["слово"] * 40)
+    _insert_skills(
+        sqlite_path,
+        [(f"zz_{i}", "Навык", f"{filler} {WORD} {filler}.") for i in range(WEAK)],
+    )
+    hits = search.search_sqlite(WORD, limit=5)
+    assert (hits[0]["section"], hits[0]["id"]) == ("skills", best)
+
+
+def test_search_does_not_write(tmp_path, monkeypatch):
+    bare = tmp_path / "bare.sqlite"
+    shutil.copy(REPO_ROOT / "morkborg.sqlite", bare)
+    con = sqlite3.connect(bare)
+    for trigger in search._sqlite_triggers():
+        con.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    con.execute("DROP TABLE IF EXISTS search_index")
+    con.commit()
+    con.execute("VACUUM")
+    con.close()
+    before = bare.read_bytes()
+
+    monkeypatch.setattr(db, "DB_PATH", str(bare))
+    with pytest.raises(RuntimeError, match="migrate"):
+        search.search_sqlite(WORD)
+    db.close_connections()
+    assert bare.read_bytes() == before
+
+
+@pytest.fixture
+def pg_connection():
+    psycopg2 = pytest.importorskip("psycopg2")
+    from pg_pool import get_pool
+
+    try:
+        connection = get_pool().getconn()
+    except (psycopg2.Error, TypeError) as e:
+        pytest.skip(f"no Postgres: {e}")
+    # Rows of the test are never committed
+    yield connection
+    connection.rollback()
+    get_pool().putconn(connection)
+
+
+def test_pg_best_hit_outside_the_first_matches(pg_connection):
+    with pg_connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM skills")
+        (start,) = cursor.fetchone()
+        filler = " ".join(["слово"] * 40)
+        cursor.executemany(
+            "INSERT INTO skills (id, slug, name_ru, desc_ru) VALUES (%s, %s, %s, %s)",
+            [
+                (start + 1 + i, f"zz_{i}", "Навык", f"{filler} {WORD} {filler}.")
+                for i in range(WEAK)
+            ],
+        )
+        best = start + WEAK + 1
+        cursor.execute(
+            "INSERT INTO skills (id, slug, name_ru, desc_ru) VALUES (%s, %s, %s, %s)",
+            (best, "zz_best", "Лучший навык", f"{WORD} {WORD} {WORD}."),
+        )
+    hits = search.search_pg(pg_connection, WORD, limit=5)
+    assert (hits[0]["section"], hits[0]["id"]) == ("skills", best)